@@ -0,0 +1,126 @@
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# Interval bounds in minutes per source when websites_config.yaml gives none
+DEFAULT_BOUNDS = {
+    'facebook': (30, 720),
+    'yad2': (60, 1440)
+}
+
+
+class AdaptiveSchedule:
+    """Per-target scrape intervals adapted to how often new listings appear
+
+    A target is a source ('yad2') or a single Facebook group
+    ('facebook:<group url>'). After each successful run the target's rate of
+    new listings per hour is smoothed (EWMA), and the next interval is the
+    time expected to yield target_new_per_run listings, clamped to the
+    source's bounds and to at most a doubling or halving per run.
+    """
+
+    def __init__(self, db_path=os.path.join('data', 'scheduler.db'), target_new_per_run=5,
+                 smoothing=0.3, bounds: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.db_path = db_path
+        self.target_new_per_run = target_new_per_run
+        self.smoothing = smoothing
+        self.bounds = dict(DEFAULT_BOUNDS, **(bounds or {}))
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.ensure_schema()
+
+    @classmethod
+    def from_config(cls, config: Dict, db_path=os.path.join('data', 'scheduler.db')):
+        """Build from the 'scheduling' section of websites_config.yaml"""
+        settings = (config or {}).get('scheduling') or {}
+        bounds = {
+            source: (limits['min_minutes'], limits['max_minutes'])
+            for source, limits in (settings.get('sources') or {}).items()
+        }
+        return cls(
+            db_path,
+            target_new_per_run=settings.get('target_new_per_run', 5),
+            smoothing=settings.get('smoothing', 0.3),
+            bounds=bounds
+        )
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ensure_schema(self):
+        """Create the rate table if it does not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_rates (
+                    target TEXT PRIMARY KEY,
+                    interval_seconds REAL NOT NULL,
+                    rate_per_hour REAL,
+                    last_run TEXT,
+                    last_new INTEGER
+                )
+            """)
+
+    def limits(self, target) -> Tuple[float, float]:
+        """(min, max) interval in seconds for a target"""
+        source = target.split(':', 1)[0]
+        low, high = self.bounds.get(source, (60, 1440))
+        return low * 60, high * 60
+
+    def get(self, target) -> Optional[Dict]:
+        with closing(self.connect()) as conn:
+            row = conn.execute('SELECT * FROM scrape_rates WHERE target = ?', (target,)).fetchone()
+        return dict(row) if row else None
+
+    def interval(self, target) -> float:
+        """Current interval in seconds; new targets start at the geometric mean of their bounds"""
+        row = self.get(target)
+        if row:
+            return row['interval_seconds']
+        low, high = self.limits(target)
+        return (low * high) ** 0.5
+
+    def record_run(self, target, new_listings, finished_at: Optional[datetime] = None) -> float:
+        """Fold a successful run's new-listing count into the target's rate; returns the next interval"""
+        finished_at = finished_at or datetime.now()
+        row = self.get(target)
+        current = row['interval_seconds'] if row else self.interval(target)
+
+        if row and row['last_run']:
+            elapsed = (finished_at - datetime.fromisoformat(row['last_run'])).total_seconds()
+        else:
+            elapsed = current
+        # A run right after a restart or a manual trigger says little about the rate
+        elapsed = max(elapsed, self.limits(target)[0])
+
+        observed = new_listings / (elapsed / 3600)
+        if row and row['rate_per_hour'] is not None:
+            rate = self.smoothing * observed + (1 - self.smoothing) * row['rate_per_hour']
+        else:
+            rate = observed
+
+        low, high = self.limits(target)
+        wanted = self.target_new_per_run / rate * 3600 if rate > 0 else high
+        interval = min(max(wanted, current / 2, low), current * 2, high)
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO scrape_rates (target, interval_seconds, rate_per_hour, last_run, last_new)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(target) DO UPDATE SET
+                    interval_seconds = excluded.interval_seconds,
+                    rate_per_hour = excluded.rate_per_hour,
+                    last_run = excluded.last_run,
+                    last_new = excluded.last_new
+                """,
+                (target, interval, rate, finished_at.isoformat(timespec='seconds'), new_listings)
+            )
+        self.logger.info(
+            f"{target}: {new_listings} new, {rate:.2f}/h, next interval {interval / 60:.0f} min"
+        )
+        return interval
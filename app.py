@@ -1,54 +1,67 @@
 from flask import Flask, render_template, request, jsonify, send_file
 from flask_sqlalchemy import SQLAlchemy
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime
 import os
 import asyncio
-from scraper import RealEstateScraper
 from models import db, Property, SearchCriteria, ScrapingLog
 from sheets_handler import GoogleSheetsHandler
 import pandas as pd
 from config import Config
+from data_version import DataVersion
+import http_cache
+from http_cache import conditional
+from property_statistics import PropertyStatistics
+from db_engine import DatabaseEngines
+from facet_index import FacetIndex, FACETS
+from geocoder import Geocoder
+from geo_index import GeoIndex
+from leader_lock import LeaderLock
+from scheduler import ScraperScheduler
+from serializers import json_response, ndjson_response, property_query, property_rows, PROPERTY_FIELDS
 
 app = Flask(__name__)
 app.config.from_object(Config)
-db.init_app(app)
+# Writes go through db.session; read-only APIs use db_engines.read_session
+db_engines = DatabaseEngines(db)
+db_engines.init_app(app)
+http_cache.init_app(app)
+
+# ETags for property APIs change whenever a commit writes rows
+data_version = DataVersion(os.path.join('data', 'data_version.db'))
+data_version.watch_session(db.session)
+property_statistics = PropertyStatistics(db_engines.read_session)
+facet_index = FacetIndex(db_engines.read_session)
+
+# New and relocated listings get coordinates from the offline gazetteer as they are saved
+geo_index = GeoIndex(Geocoder())
+geo_index.watch_session(db.session)
+
+scheduler_lock = LeaderLock('scrape-scheduler')
+
+# Larger pulls should use the NDJSON stream
+MAX_API_LIMIT = 5000
+
+def page_args(default_limit):
+    """(limit, offset) from the query string, limit clamped to 1..MAX_API_LIMIT; None if offset is negative"""
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), MAX_API_LIMIT))
+    offset = request.args.get('offset', 0, type=int)
+    return None if offset < 0 else (limit, offset)
 
 def init_db():
     """Initialize database"""
     with app.app_context():
         db.create_all()
-
-def start_scraper():
-    """Initialize and start the scraper"""
-    with app.app_context():
-        scraper = RealEstateScraper()
-        listings = scraper.run()
-        
-        # Log scraping activity
-        log = ScrapingLog(
-            website="all",
-            end_time=datetime.utcnow(),
-            status="success" if listings else "failed",
-            items_scraped=len(listings),
-            items_new=len(listings)
-        )
-        db.session.add(log)
-        db.session.commit()
+        geo_index.backfill(db.session)
 
 def setup_scheduler():
-    """Setup scheduled tasks"""
-    scheduler = BackgroundScheduler()
-    
-    # Add scraping jobs
-    if Config.SCRAPING_INTERVALS['hourly']:
-        scheduler.add_job(start_scraper, 'interval', hours=1)
-    if Config.SCRAPING_INTERVALS['daily']:
-        scheduler.add_job(start_scraper, 'cron', hour=9)  # Run at 9 AM
-    if Config.SCRAPING_INTERVALS['weekly']:
-        scheduler.add_job(start_scraper, 'cron', day_of_week='mon', hour=9)  # Run Mondays at 9 AM
-        
-    scheduler.start()
+    """Setup scheduled tasks in whichever process holds the scheduler lock"""
+    # Only called under python app.py (gunicorn workers never schedule). The lock
+    # is shared with scheduler.py, so if both run, one runs the jobs and the
+    # other waits to take over
+    scheduler_lock.run_when_leader(start_scheduler)
+
+def start_scheduler():
+    """Run scheduler.py's adaptive per-source scrape jobs in this process"""
+    ScraperScheduler(leader=scheduler_lock).start_jobs()
 
 @app.route('/')
 def home():
@@ -101,20 +114,60 @@ def search_criteria():
     return render_template('search_criteria.html', criteria=criteria_list)
 
 @app.route('/api/properties')
+@conditional(data_version.get)
 def api_properties():
-    """API endpoint for properties"""
-    properties = Property.query.order_by(Property.date_scraped.desc()).limit(100).all()
-    return jsonify([{
-        'id': p.id,
-        'title': p.title,
-        'price': p.price,
-        'location': p.location,
-        'size': p.size,
-        'property_type': p.property_type,
-        'url': p.url,
-        'source_website': p.source_website,
-        'date_scraped': p.date_scraped.isoformat()
-    } for p in properties])
+    """API endpoint for properties (?limit=, ?offset=, ?bbox=min_lon,min_lat,max_lon,max_lat, ?lat=&lon=&radius_km=)"""
+    page = page_args(100)
+    if page is None:
+        return jsonify({'error': 'offset must not be negative'}), 400
+    limit, offset = page
+
+    if request.args.get('bbox'):
+        try:
+            bbox = tuple(float(v) for v in request.args['bbox'].split(','))
+        except ValueError:
+            bbox = ()
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return jsonify({'error': 'bbox must be min_lon,min_lat,max_lon,max_lat'}), 400
+        return json_response(geo_index.rows(db_engines.read_session, bbox=bbox, limit=limit, offset=offset))
+
+    if request.args.get('radius_km'):
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        radius_km = request.args.get('radius_km', type=float)
+        if lat is None or lon is None or not radius_km or radius_km <= 0:
+            return jsonify({'error': 'radius search needs lat, lon and a positive radius_km'}), 400
+        return json_response(geo_index.rows(
+            db_engines.read_session, center=(lat, lon), radius_km=radius_km, limit=limit, offset=offset
+        ))
+
+    return json_response(property_rows(db_engines.read_session, limit, offset))
+
+@app.route('/api/properties.ndjson')
+def api_properties_stream():
+    """Stream every property (or ?limit= of them) as newline-delimited JSON"""
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    return ndjson_response(db_engines.read_session, property_query(limit), PROPERTY_FIELDS)
+
+@app.route('/api/search')
+@conditional(data_version.get)
+def api_search():
+    """Faceted search: ?property_type=&source_website=&city=&price_bucket=&size_bucket= (repeatable)"""
+    facet_index.refresh(data_version.get())
+    filters = {facet: request.args.getlist(facet) for facet in FACETS}
+    page = page_args(50)
+    if page is None:
+        return jsonify({'error': 'offset must not be negative'}), 400
+    limit, offset = page
+    return json_response(facet_index.search(filters, limit, offset))
+
+@app.route('/api/statistics')
+@conditional(data_version.get)
+def api_statistics():
+    """Dashboard statistics from SQL aggregates, cached per data version"""
+    return json_response(property_statistics.get(data_version.get()))
 
 @app.route('/export-properties')
 def export_properties():
@@ -0,0 +1,63 @@
+import logging
+import os
+import sqlite3
+from contextlib import closing
+
+
+class DataVersion:
+    """Cross-process counter bumped whenever listing data is written
+
+    HTTP handlers derive ETags from it, so a client holding the current
+    version can be answered with 304 without rebuilding the response.
+    """
+
+    def __init__(self, db_path=os.path.join('data', 'data_version.db')):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.ensure_schema()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def ensure_schema(self):
+        """Create the counter table if it does not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS data_version (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+
+    def get(self, name='listings') -> int:
+        with closing(self.connect()) as conn:
+            row = conn.execute('SELECT version FROM data_version WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name='listings') -> int:
+        """Increment and return the version"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO data_version (name, version) VALUES (?, 1) '
+                'ON CONFLICT(name) DO UPDATE SET version = version + 1',
+                (name,)
+            )
+            return conn.execute('SELECT version FROM data_version WHERE name = ?', (name,)).fetchone()[0]
+
+    def watch_session(self, session, name='listings'):
+        """Bump the version after every SQLAlchemy commit that wrote rows"""
+        from sqlalchemy import event
+
+        @event.listens_for(session, 'after_flush')
+        def mark_dirty(session, flush_context):
+            if session.new or session.dirty or session.deleted:
+                session.info['data_version_dirty'] = True
+
+        @event.listens_for(session, 'after_commit')
+        def bump_on_commit(session):
+            if session.info.pop('data_version_dirty', False):
+                try:
+                    self.bump(name)
+                except Exception as e:
+                    self.logger.error(f"Error bumping data version: {str(e)}")
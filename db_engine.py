@@ -0,0 +1,101 @@
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+# Pool and lock-wait settings per mode. Writers are kept to a few connections
+# since SQLite serialises them anyway; readers get a wider pool and a short
+# busy timeout so a stuck lock surfaces instead of piling up.
+POOL_SETTINGS = {
+    'read': {'pool_size': 10, 'max_overflow': 10, 'busy_timeout': 5},
+    'write': {'pool_size': 2, 'max_overflow': 2, 'busy_timeout': 15}
+}
+
+
+def is_sqlite_file(uri) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(uri, mode='write') -> dict:
+    """create_engine() keyword arguments for a mode ('read'/'write')"""
+    settings = POOL_SETTINGS[mode]
+    if make_url(uri).get_backend_name() != 'sqlite':
+        return {
+            'pool_size': settings['pool_size'],
+            'max_overflow': settings['max_overflow'],
+            'pool_pre_ping': True
+        }
+    if not is_sqlite_file(uri):
+        # In-memory databases use a single shared connection; pool options do not apply
+        return {}
+    return {
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'connect_args': {'timeout': settings['busy_timeout'], 'check_same_thread': False}
+    }
+
+
+def enable_wal(engine, busy_timeout, read_only=False):
+    """Switch every new SQLite connection of engine to WAL with the given busy timeout
+
+    In WAL mode readers see the last committed snapshot while a writer is
+    mid-transaction, so a scraper commit no longer stalls dashboard queries.
+    """
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout * 1000)}')
+            if read_only:
+                cursor.execute('PRAGMA query_only=ON')
+        finally:
+            cursor.close()
+
+
+class DatabaseEngines:
+    """Configures the Flask-SQLAlchemy engine for writes and a separate pool for reads
+
+    Writes keep going through db.session. Read-only handlers use
+    read_session, whose connections come from their own pool and are
+    marked query_only, so they never wait behind a writer for a connection.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.read_engine = None
+        self.read_session = None
+
+    def init_app(self, app):
+        """Set engine options and bind db to app"""
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        options.update(engine_options(uri, 'write'))
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        self.db.init_app(app)
+
+        sqlite_file = is_sqlite_file(uri)
+        with app.app_context():
+            write_engine = self.db.engine
+            if sqlite_file:
+                enable_wal(write_engine, POOL_SETTINGS['write']['busy_timeout'])
+
+        if make_url(uri).get_backend_name() == 'sqlite' and not sqlite_file:
+            # An in-memory database only exists inside the write engine's connection
+            self.read_engine = write_engine
+        else:
+            # Use the engine's resolved URL; Flask-SQLAlchemy may have moved a relative path into instance/
+            self.read_engine = create_engine(write_engine.url, **engine_options(uri, 'read'))
+            if sqlite_file:
+                enable_wal(self.read_engine, POOL_SETTINGS['read']['busy_timeout'], read_only=True)
+        self.read_session = scoped_session(sessionmaker(bind=self.read_engine))
+
+        @app.teardown_appcontext
+        def remove_read_session(exception=None):
+            self.read_session.remove()
+
+        self.logger.info(f"Database engines configured (WAL: {sqlite_file})")
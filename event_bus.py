@@ -0,0 +1,108 @@
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class Subscription:
+    """One subscriber's bounded event queue; the oldest events are dropped when it is full"""
+
+    def __init__(self, bus, maxsize=1000):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if none arrived within timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process publish/subscribe fan-out for server-sent events"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def subscribe(self, maxsize=1000) -> Subscription:
+        subscription = Subscription(self, maxsize)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self.lock:
+            return len(self.subscribers)
+
+    def publish(self, event: Dict[str, Any]):
+        """Deliver an event ({'id', 'type', 'data'}) to every subscriber"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+class EventRelay:
+    """Feeds events recorded in the shared job database into this process's EventBus
+
+    Scrapes run in the job worker process, so their events reach each web
+    process through the scrape_events table. One relay thread per process reads
+    new rows once per interval, however many clients are streaming.
+    """
+
+    def __init__(self, store, bus: EventBus, interval=1.0):
+        self.store = store
+        self.bus = bus
+        self.interval = interval
+        self.last_id = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """Start relaying from the newest event onwards (idempotent)"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.last_id = self.store.last_event_id()
+            self.thread = threading.Thread(target=self.run, name='event-relay', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                for event in self.store.events_since(self.last_id):
+                    self.last_id = event['id']
+                    self.bus.publish(event)
+            except Exception as e:
+                self.logger.error(f"Error relaying events: {str(e)}")
+            time.sleep(self.interval)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event in text/event-stream format"""
+    data = json.dumps(event['data'], ensure_ascii=False, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
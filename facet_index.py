@@ -0,0 +1,216 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select
+
+from models import Property
+from serializers import PROPERTY_COLUMNS, PROPERTY_FIELDS
+
+# Bucket edges for the numeric facets; a value falls in [edge, next edge)
+PRICE_EDGES = (0, 500_000, 1_000_000, 2_000_000, 3_000_000, 5_000_000, 10_000_000)
+SIZE_EDGES = (0, 50, 100, 200, 500, 1000, 5000)
+
+# Rows updated this long before the previous refresh are re-read, covering
+# transactions that were still open when it ran
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+FACETS = ('property_type', 'source_website', 'city', 'price_bucket', 'size_bucket')
+
+
+def popcount(bitmap: int) -> int:
+    if hasattr(bitmap, 'bit_count'):  # Python 3.10+
+        return bitmap.bit_count()
+    return bin(bitmap).count('1')
+
+
+def bitmap_from_ids(ids) -> int:
+    """Bitmap with the given bits set, built in one pass rather than one big-int copy per id"""
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for row_id in ids:
+        buffer[row_id >> 3] |= 1 << (row_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_ids_desc(bitmap: int):
+    """Set bit positions of bitmap, highest (newest row id) first"""
+    while bitmap:
+        position = bitmap.bit_length() - 1
+        yield position
+        bitmap ^= 1 << position
+
+
+def bucket_label(value, edges) -> str:
+    """Label of the [lo, hi) bucket containing value, e.g. '500000-1000000' or '10000000+'"""
+    if value is None:
+        return 'unknown'
+    for lo, hi in zip(edges, edges[1:]):
+        if value < hi:
+            return f"{lo}-{hi}"
+    return f"{edges[-1]}+"
+
+
+def city_of(location) -> str:
+    """City part of a stored location: the 'city' key of a JSON dict, else the text before the first comma"""
+    if not location:
+        return 'unknown'
+    if location.startswith('{'):
+        try:
+            data = json.loads(location)
+            return data.get('city') or data.get('neighborhood') or 'unknown'
+        except ValueError:
+            pass
+    return location.split(',')[0].strip() or 'unknown'
+
+
+class FacetIndex:
+    """In-memory bitmap index over Property for faceted search
+
+    Each facet value maps to a bitmap (a Python int with bit n set for
+    Property id n), so a filter combination is a few ANDs/ORs and a facet
+    count is a popcount. The index catches up incrementally: refresh() only
+    reads rows inserted or updated since the last refresh.
+    """
+
+    def __init__(self, session, price_edges=PRICE_EDGES, size_edges=SIZE_EDGES):
+        self.session = session
+        self.price_edges = price_edges
+        self.size_edges = size_edges
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.version = None
+        self.reset()
+
+    def reset(self):
+        self.bitmaps = {facet: {} for facet in FACETS}
+        self.all = 0
+        self.values = {}  # id -> facet values, to unset bits when a row changes
+        self.max_id = 0
+        self.updated_at = None
+
+    def facet_values(self, property_type, source_website, location, price, size) -> dict:
+        return {
+            'property_type': property_type or 'unknown',
+            'source_website': source_website or 'unknown',
+            'city': city_of(location),
+            'price_bucket': bucket_label(price, self.price_edges),
+            'size_bucket': bucket_label(size, self.size_edges)
+        }
+
+    def update(self, rows) -> int:
+        """Index (row_id, facet values) pairs, replacing what was indexed for them before
+
+        Bits are gathered per facet value and merged with one OR/AND each,
+        and rows whose facet values did not change are skipped.
+        """
+        added = defaultdict(list)
+        removed = defaultdict(list)
+        new_ids = []
+        for row_id, values in rows:
+            old = self.values.get(row_id)
+            if old == values:
+                continue
+            if old is None:
+                new_ids.append(row_id)
+            for facet, value in values.items():
+                if old is None or old[facet] != value:
+                    added[(facet, value)].append(row_id)
+                    if old is not None:
+                        removed[(facet, old[facet])].append(row_id)
+            self.values[row_id] = values
+            self.max_id = max(self.max_id, row_id)
+
+        for (facet, value), ids in removed.items():
+            bitmaps = self.bitmaps[facet]
+            bitmaps[value] &= ~bitmap_from_ids(ids)
+            if not bitmaps[value]:
+                del bitmaps[value]
+        for (facet, value), ids in added.items():
+            bitmaps = self.bitmaps[facet]
+            bitmaps[value] = bitmaps.get(value, 0) | bitmap_from_ids(ids)
+        self.all |= bitmap_from_ids(new_ids)
+        return len(new_ids) + len({row_id for ids in removed.values() for row_id in ids})
+
+    def refresh(self, version=None):
+        """Bring the index up to date with the database, once per data version"""
+        with self.lock:
+            if version is not None and version == self.version:
+                return
+            started = datetime.utcnow()
+            total = self.session.execute(select(func.count(Property.id))).scalar()
+            if total < len(self.values):
+                # Rows were deleted; ids cannot tell us which, so rebuild
+                self.reset()
+
+            query = select(
+                Property.id, Property.property_type, Property.source_website,
+                Property.location, Property.price, Property.size
+            )
+            if self.values:
+                changed = Property.id > self.max_id
+                if self.updated_at:
+                    changed = or_(changed, Property.last_updated >= self.updated_at - REFRESH_OVERLAP)
+                query = query.where(changed)
+
+            count = self.update(
+                (row_id, self.facet_values(*fields)) for row_id, *fields in self.session.execute(query)
+            )
+            self.updated_at = started
+            self.version = version
+            if count:
+                self.logger.info(f"Facet index refreshed: {count} rows indexed, {len(self.values)} total")
+
+    def search(self, filters=None, limit=50, offset=0) -> dict:
+        """Rows matching filters ({facet: [values]}) plus per-facet value counts
+
+        Values within a facet are ORed and facets are ANDed. Each facet's
+        counts ignore that facet's own filter, so the UI can show how many
+        rows selecting another value would give.
+        """
+        filters = {facet: values for facet, values in (filters or {}).items() if facet in FACETS and values}
+        with self.lock:
+            masks = {}
+            for facet, values in filters.items():
+                mask = 0
+                for value in values:
+                    mask |= self.bitmaps[facet].get(value, 0)
+                masks[facet] = mask
+
+            matched = self.all
+            for mask in masks.values():
+                matched &= mask
+
+            facets = {}
+            for facet in FACETS:
+                base = self.all
+                for other, mask in masks.items():
+                    if other != facet:
+                        base &= mask
+                counts = {value: popcount(bitmap & base) for value, bitmap in self.bitmaps[facet].items()}
+                facets[facet] = dict(sorted(((v, c) for v, c in counts.items() if c), key=lambda item: -item[1]))
+
+            ids = []
+            for position, row_id in enumerate(iter_ids_desc(matched)):
+                if position >= offset + limit:
+                    break
+                if position >= offset:
+                    ids.append(row_id)
+            total = popcount(matched)
+
+        return {
+            'total': total,
+            'rows': self.load_rows(ids),
+            'facets': facets
+        }
+
+    def load_rows(self, ids):
+        """API rows for ids, in the given order"""
+        if not ids:
+            return []
+        rows = self.session.execute(select(*PROPERTY_COLUMNS).where(Property.id.in_(ids)))
+        by_id = {row[0]: dict(zip(PROPERTY_FIELDS, row)) for row in rows}
+        return [by_id[row_id] for row_id in ids if row_id in by_id]
@@ -0,0 +1,461 @@
+"""Local stand-in for the parts of the Google Sheets v4 API used by GoogleSheetsHandler.
+
+Implements spreadsheets.create, spreadsheets.get, spreadsheets.batchUpdate,
+values.get, values.update, values.append and values.batchUpdate over an
+in-memory grid, with optional per-request latency, a requests-per-minute quota
+answered with 429 and random 5xx errors. Point the handler at it with
+GoogleSheetsHandler(None, api_endpoint=server.url).
+
+Run standalone with: python fake_sheets_server.py --port 8765 --latency 0.05
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse, parse_qs
+
+# Same per-spreadsheet cell limit as the real API
+MAX_CELLS = 10_000_000
+
+
+class SheetsApiError(Exception):
+    def __init__(self, code, message, status):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def column_index(letters):
+    """Convert column letters (A, K, AA) to a 0-based index"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index - 1
+
+
+def column_letters(index):
+    """Convert a 0-based column index to letters"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def parse_range(a1):
+    """Split an A1 range into (sheet title, first col, first row, last col, last row)
+
+    Columns are 0-based, rows 1-based; open ends are None.
+    """
+    if '!' in a1:
+        title, cells = a1.rsplit('!', 1)
+    else:
+        title, cells = a1, ''
+    title = title.strip("'").replace("''", "'")
+
+    def parse_cell(cell):
+        match = re.fullmatch(r'([A-Z]*)(\d*)', cell)
+        if not match:
+            raise SheetsApiError(400, f'Unable to parse range: {a1}', 'INVALID_ARGUMENT')
+        col = column_index(match.group(1)) if match.group(1) else None
+        row = int(match.group(2)) if match.group(2) else None
+        return col, row
+
+    if not cells:
+        return title, None, None, None, None
+    start, _, end = cells.partition(':')
+    start_col, start_row = parse_cell(start)
+    end_col, end_row = parse_cell(end) if end else (start_col, start_row)
+    return title, start_col, start_row, end_col, end_row
+
+
+class FakeSpreadsheetStore:
+    """In-memory spreadsheets: {spreadsheet_id: {title: sheet}}"""
+
+    def __init__(self, max_cells=MAX_CELLS):
+        self.max_cells = max_cells
+        self.spreadsheets = {}
+        self.lock = threading.RLock()
+
+    def get_book(self, spreadsheet_id):
+        """Get a spreadsheet, creating it with a default sheet on first use"""
+        if spreadsheet_id not in self.spreadsheets:
+            self.spreadsheets[spreadsheet_id] = OrderedDict()
+            self.add_sheet(spreadsheet_id, {'title': 'Sheet1', 'sheetId': 0})
+        return self.spreadsheets[spreadsheet_id]
+
+    def get_sheet(self, spreadsheet_id, title):
+        sheet = self.get_book(spreadsheet_id).get(title)
+        if sheet is None:
+            raise SheetsApiError(400, f'Unable to parse range: {title}', 'INVALID_ARGUMENT')
+        return sheet
+
+    def get_sheet_by_id(self, spreadsheet_id, sheet_id):
+        for sheet in self.get_book(spreadsheet_id).values():
+            if sheet['sheetId'] == sheet_id:
+                return sheet
+        raise SheetsApiError(400, f'No grid with id: {sheet_id}', 'INVALID_ARGUMENT')
+
+    def add_sheet(self, spreadsheet_id, properties):
+        book = self.spreadsheets.setdefault(spreadsheet_id, OrderedDict())
+        title = properties.get('title') or f'Sheet{len(book) + 1}'
+        if title in book:
+            raise SheetsApiError(
+                400,
+                f'Invalid requests[0].addSheet: A sheet with the name "{title}" already exists. '
+                f'Please enter another name.',
+                'INVALID_ARGUMENT'
+            )
+        sheet_id = properties.get('sheetId')
+        if sheet_id is None:
+            sheet_id = max((s['sheetId'] for s in book.values()), default=-1) + 1
+        grid = properties.get('gridProperties', {})
+        book[title] = {
+            'title': title,
+            'sheetId': sheet_id,
+            'frozenRowCount': grid.get('frozenRowCount', 0),
+            'rows': []
+        }
+        return self.sheet_properties(book[title])
+
+    def sheet_properties(self, sheet):
+        return {
+            'sheetId': sheet['sheetId'],
+            'title': sheet['title'],
+            'gridProperties': {
+                'rowCount': max(len(sheet['rows']), 1000),
+                'columnCount': max((len(r) for r in sheet['rows']), default=26),
+                'frozenRowCount': sheet['frozenRowCount']
+            }
+        }
+
+    def cell_count(self, spreadsheet_id):
+        return sum(
+            len(sheet['rows']) * max((len(r) for r in sheet['rows']), default=0)
+            for sheet in self.get_book(spreadsheet_id).values()
+        )
+
+    def read(self, spreadsheet_id, a1):
+        title, start_col, start_row, end_col, end_row = parse_range(a1)
+        rows = self.get_sheet(spreadsheet_id, title)['rows']
+        first = (start_row or 1) - 1
+        last = end_row if end_row else len(rows)
+        col_from = start_col or 0
+        values = []
+        for row in rows[first:last]:
+            cells = row[col_from:end_col + 1] if end_col is not None else row[col_from:]
+            while cells and cells[-1] in ('', None):
+                cells = cells[:-1]
+            values.append(list(cells))
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def write(self, spreadsheet_id, a1, values):
+        title, start_col, start_row, _, _ = parse_range(a1)
+        rows = self.get_sheet(spreadsheet_id, title)['rows']
+        first = (start_row or 1) - 1
+        col_from = start_col or 0
+
+        added_cells = sum(len(v) for v in values)
+        # Only writes that grow the grid can hit the cell limit
+        grows = first + len(values) > len(rows)
+        if grows and self.cell_count(spreadsheet_id) + added_cells > self.max_cells:
+            raise SheetsApiError(
+                400,
+                f'This action would increase the number of cells in the workbook above the '
+                f'limit of {self.max_cells} cells.',
+                'INVALID_ARGUMENT'
+            )
+
+        for offset, value_row in enumerate(values):
+            while len(rows) <= first + offset:
+                rows.append([])
+            row = rows[first + offset]
+            if len(row) < col_from + len(value_row):
+                row.extend([''] * (col_from + len(value_row) - len(row)))
+            row[col_from:col_from + len(value_row)] = value_row
+        rows_written = len(values)
+        cols_written = max((len(v) for v in values), default=0)
+        return (
+            f"{title}!{column_letters(col_from)}{first + 1}:"
+            f"{column_letters(col_from + max(cols_written, 1) - 1)}{first + rows_written}"
+        ), rows_written, added_cells
+
+    def append(self, spreadsheet_id, a1, values):
+        title, start_col, _, _, _ = parse_range(a1)
+        rows = self.get_sheet(spreadsheet_id, title)['rows']
+
+        # Append below the last row holding any data
+        last = len(rows)
+        while last and not any(cell not in ('', None) for cell in rows[last - 1]):
+            last -= 1
+        anchor = f"{title}!{column_letters(start_col or 0)}{last + 1}"
+        return self.write(spreadsheet_id, anchor, values)
+
+    def batch_update(self, spreadsheet_id, requests):
+        """Apply structural requests; like the real API, any failure leaves nothing applied"""
+        book = self.get_book(spreadsheet_id)
+        snapshot = OrderedDict(
+            (title, dict(sheet, rows=[list(r) for r in sheet['rows']])) for title, sheet in book.items()
+        )
+        try:
+            return [self._apply_request(spreadsheet_id, request) for request in requests]
+        except Exception:
+            self.spreadsheets[spreadsheet_id] = snapshot
+            raise
+
+    def _apply_request(self, spreadsheet_id, request):
+        kind, body = next(iter(request.items()))
+
+        if kind == 'addSheet':
+            return {'addSheet': {'properties': self.add_sheet(spreadsheet_id, body.get('properties', {}))}}
+
+        if kind == 'updateSheetProperties':
+            properties = body['properties']
+            sheet = self.get_sheet_by_id(spreadsheet_id, properties['sheetId'])
+            if 'title' in properties and properties['title'] != sheet['title']:
+                book = self.get_book(spreadsheet_id)
+                if properties['title'] in book:
+                    raise SheetsApiError(400, f'A sheet with the name "{properties["title"]}" already exists.',
+                                         'INVALID_ARGUMENT')
+                del book[sheet['title']]
+                sheet['title'] = properties['title']
+                book[sheet['title']] = sheet
+            grid = properties.get('gridProperties', {})
+            if 'frozenRowCount' in grid:
+                sheet['frozenRowCount'] = grid['frozenRowCount']
+            return {}
+
+        if kind == 'updateCells':
+            start = body['start']
+            sheet = self.get_sheet_by_id(spreadsheet_id, start['sheetId'])
+            values = [
+                [self._cell_value(cell) for cell in row.get('values', [])]
+                for row in body.get('rows', [])
+            ]
+            anchor = f"{sheet['title']}!{column_letters(start.get('columnIndex', 0))}{start.get('rowIndex', 0) + 1}"
+            self.write(spreadsheet_id, anchor, values)
+            return {}
+
+        if kind == 'deleteDimension':
+            grid_range = body['range']
+            sheet = self.get_sheet_by_id(spreadsheet_id, grid_range['sheetId'])
+            if grid_range.get('dimension') == 'ROWS':
+                del sheet['rows'][grid_range['startIndex']:grid_range['endIndex']]
+            return {}
+
+        if kind == 'deleteSheet':
+            sheet = self.get_sheet_by_id(spreadsheet_id, body['sheetId'])
+            del self.get_book(spreadsheet_id)[sheet['title']]
+            return {}
+
+        if kind in ('repeatCell', 'autoResizeDimensions'):
+            # Formatting only; validate the sheet exists
+            grid_range = body.get('range') or body.get('dimensions') or {}
+            if 'sheetId' in grid_range:
+                self.get_sheet_by_id(spreadsheet_id, grid_range['sheetId'])
+            return {}
+
+        raise SheetsApiError(400, f'Unsupported request: {kind}', 'INVALID_ARGUMENT')
+
+    @staticmethod
+    def _cell_value(cell):
+        value = cell.get('userEnteredValue', {})
+        return next(iter(value.values()), '') if value else ''
+
+
+class FakeSheetsRequestHandler(BaseHTTPRequestHandler):
+    """Routes Sheets v4 REST calls to the server's FakeSpreadsheetStore"""
+
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = [
+        ('POST', re.compile(r'^/v4/spreadsheets$'), 'spreadsheets_create'),
+        ('GET', re.compile(r'^/v4/spreadsheets/([^/:]+)$'), 'spreadsheets_get'),
+        ('POST', re.compile(r'^/v4/spreadsheets/([^/:]+):batchUpdate$'), 'spreadsheets_batch_update'),
+        ('POST', re.compile(r'^/v4/spreadsheets/([^/:]+)/values:batchUpdate$'), 'values_batch_update'),
+        ('POST', re.compile(r'^/v4/spreadsheets/([^/:]+)/values/(.+):append$'), 'values_append'),
+        ('GET', re.compile(r'^/v4/spreadsheets/([^/:]+)/values/(.+)$'), 'values_get'),
+        ('PUT', re.compile(r'^/v4/spreadsheets/([^/:]+)/values/(.+)$'), 'values_update'),
+    ]
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def dispatch(self, method):
+        server = self.server
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        server.record_request()
+
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            server.check_quota()
+            if server.error_rate and random.random() < server.error_rate:
+                raise SheetsApiError(503, 'The service is currently unavailable.', 'UNAVAILABLE')
+
+            for route_method, pattern, name in self.ROUTES:
+                match = pattern.match(parsed.path)
+                if route_method == method and match:
+                    args = [unquote(group) for group in match.groups()]
+                    with server.store.lock:
+                        result = getattr(self, name)(*args, body=body, query=parse_qs(parsed.query))
+                    return self.send_json(200, result)
+            raise SheetsApiError(404, f'Unknown endpoint {method} {parsed.path}', 'NOT_FOUND')
+
+        except SheetsApiError as e:
+            self.send_json(e.code, {'error': {'code': e.code, 'message': e.message, 'status': e.status}})
+
+    def send_json(self, code, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        if code == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def spreadsheets_get(self, spreadsheet_id, body, query):
+        store = self.server.store
+        book = store.get_book(spreadsheet_id)
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'sheets': [{'properties': store.sheet_properties(sheet)} for sheet in book.values()]
+        }
+
+    def spreadsheets_create(self, body, query):
+        store = self.server.store
+        spreadsheet_id = f'fake-{len(store.spreadsheets) + 1}'
+        store.get_book(spreadsheet_id)
+        return {'spreadsheetId': spreadsheet_id, 'properties': body.get('properties', {})}
+
+    def spreadsheets_batch_update(self, spreadsheet_id, body, query):
+        replies = self.server.store.batch_update(spreadsheet_id, body.get('requests', []))
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    def values_get(self, spreadsheet_id, a1, body, query):
+        values = self.server.store.read(spreadsheet_id, a1)
+        result = {'range': a1, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def values_update(self, spreadsheet_id, a1, body, query):
+        updated_range, rows, cells = self.server.store.write(spreadsheet_id, a1, body.get('values', []))
+        return {'spreadsheetId': spreadsheet_id, 'updatedRange': updated_range,
+                'updatedRows': rows, 'updatedCells': cells}
+
+    def values_append(self, spreadsheet_id, a1, body, query):
+        updated_range, rows, cells = self.server.store.append(spreadsheet_id, a1, body.get('values', []))
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'tableRange': a1,
+            'updates': {'updatedRange': updated_range, 'updatedRows': rows, 'updatedCells': cells}
+        }
+
+    def values_batch_update(self, spreadsheet_id, body, query):
+        responses = []
+        for data in body.get('data', []):
+            updated_range, rows, cells = self.server.store.write(spreadsheet_id, data['range'], data['values'])
+            responses.append({'updatedRange': updated_range, 'updatedRows': rows, 'updatedCells': cells})
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'totalUpdatedRows': sum(r['updatedRows'] for r in responses),
+            'totalUpdatedCells': sum(r['updatedCells'] for r in responses),
+            'responses': responses
+        }
+
+
+class FakeSheetsServer(ThreadingHTTPServer):
+    """Threaded fake Sheets API server with configurable latency and quota errors"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, quota_per_minute=None,
+                 error_rate=0.0, max_cells=MAX_CELLS):
+        super().__init__((host, port), FakeSheetsRequestHandler)
+        self.store = FakeSpreadsheetStore(max_cells)
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.request_times = deque()
+        self.request_count = 0
+        self.counter_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record_request(self):
+        with self.counter_lock:
+            self.request_count += 1
+
+    def check_quota(self):
+        """Answer 429 once more than quota_per_minute requests arrived in the last minute"""
+        if not self.quota_per_minute:
+            return
+        with self.counter_lock:
+            now = time.monotonic()
+            while self.request_times and now - self.request_times[0] > 60:
+                self.request_times.popleft()
+            if len(self.request_times) >= self.quota_per_minute:
+                raise SheetsApiError(
+                    429,
+                    "Quota exceeded for quota metric 'Write requests' and limit "
+                    "'Write requests per minute per user'.",
+                    'RESOURCE_EXHAUSTED'
+                )
+            self.request_times.append(now)
+
+    def start(self):
+        """Serve on a daemon thread"""
+        self.thread = threading.Thread(target=self.serve_forever, name='fake-sheets', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local fake Google Sheets API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--quota', type=int, default=None, help='requests per minute before 429s')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 503')
+    args = parser.parse_args()
+
+    server = FakeSheetsServer(port=args.port, latency=args.latency,
+                              quota_per_minute=args.quota, error_rate=args.error_rate)
+    print(f'Fake Sheets API listening on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import logging
+import math
+
+from sqlalchemy import and_, event, inspect, or_, select
+
+from models import Property, PropertyLocation
+from serializers import PROPERTY_COLUMNS, PROPERTY_FIELDS
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0
+
+# Bounding boxes are covered by at most this many geohash cells
+MAX_COVER_CELLS = 32
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 9) -> str:
+    """Standard base-32 geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if coordinate >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision: int):
+    """(height, width) in degrees of a geohash cell"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_cover(bbox, max_cells=MAX_COVER_CELLS):
+    """Geohash prefixes whose cells together cover bbox (min_lon, min_lat, max_lon, max_lat)"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    for precision in range(9, 0, -1):
+        height, width = geohash_cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / height) + 1
+        cols = math.ceil((max_lon - min_lon) / width) + 1
+        if rows * cols <= max_cells or precision == 1:
+            break
+
+    cells = set()
+    for i in range(rows + 1):
+        lat = min(min_lat + i * height, max_lat)
+        for j in range(cols + 1):
+            lon = min(min_lon + j * width, max_lon)
+            cells.add(geohash_encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """Bounding box (min_lon, min_lat, max_lon, max_lat) enclosing a circle"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(latitude)), 1e-6)))
+    return (longitude - dlon, latitude - dlat, longitude + dlon, latitude + dlat)
+
+
+class GeoIndex:
+    """Attaches geocoded coordinates to listings and answers bbox/radius queries
+
+    Coordinates live in PropertyLocation with an indexed geohash. A bbox is
+    translated into a handful of geohash prefix ranges, so the database
+    reads only nearby rows before the exact coordinate check.
+    """
+
+    def __init__(self, geocoder, precision=9):
+        self.geocoder = geocoder
+        self.precision = precision
+        self.logger = logging.getLogger(__name__)
+
+    def locate(self, prop: Property) -> bool:
+        """Set or clear prop.point from its location; True when coordinates were found"""
+        place = self.geocoder.geocode(prop.location)
+        if place is None:
+            prop.point = None
+            return False
+
+        point = prop.point or PropertyLocation()
+        point.latitude = place['latitude']
+        point.longitude = place['longitude']
+        point.geohash = geohash_encode(place['latitude'], place['longitude'], self.precision)
+        point.place = place['name']
+        point.precision = place['precision']
+        prop.point = point
+        return True
+
+    def watch_session(self, session):
+        """Geocode new listings, and listings whose location changed, as they are flushed"""
+        @event.listens_for(session, 'before_flush')
+        def geocode_listings(session, flush_context, instances):
+            for obj in list(session.new) + list(session.dirty):
+                if not isinstance(obj, Property):
+                    continue
+                if obj in session.new or inspect(obj).attrs.location.history.has_changes():
+                    try:
+                        self.locate(obj)
+                    except Exception as e:
+                        self.logger.error(f"Error geocoding listing {obj.url}: {str(e)}")
+
+    def backfill(self, session, batch_size=500) -> int:
+        """Geocode stored listings that have no coordinates yet"""
+        located = 0
+        last_id = 0
+        while True:
+            batch = session.execute(
+                select(Property)
+                .outerjoin(PropertyLocation, PropertyLocation.property_id == Property.id)
+                .where(PropertyLocation.property_id.is_(None), Property.id > last_id)
+                .order_by(Property.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not batch:
+                break
+            for prop in batch:
+                located += self.locate(prop)
+            last_id = batch[-1].id
+            session.commit()
+        if located:
+            self.logger.info(f"Geocoded {located} stored listings")
+        return located
+
+    @staticmethod
+    def bbox_query(bbox):
+        """Properties with coordinates inside bbox, via geohash prefix ranges then exact bounds"""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # '{' sorts right after 'z', so [prefix, prefix + '{') is every hash starting with prefix
+        ranges = [
+            and_(PropertyLocation.geohash >= prefix, PropertyLocation.geohash < prefix + '{')
+            for prefix in geohash_cover(bbox)
+        ]
+        return (
+            select(*PROPERTY_COLUMNS, PropertyLocation.latitude, PropertyLocation.longitude)
+            .join(PropertyLocation, PropertyLocation.property_id == Property.id)
+            .where(or_(*ranges))
+            .where(PropertyLocation.latitude.between(min_lat, max_lat))
+            .where(PropertyLocation.longitude.between(min_lon, max_lon))
+        )
+
+    def rows(self, session, bbox=None, center=None, radius_km=None, limit=100, offset=0):
+        """API rows inside bbox (newest first) or within radius_km of center (nearest first)"""
+        fields = PROPERTY_FIELDS + ('latitude', 'longitude')
+        if center is None:
+            query = self.bbox_query(bbox).order_by(Property.date_scraped.desc()).offset(offset).limit(limit)
+            return [dict(zip(fields, row)) for row in session.execute(query)]
+
+        latitude, longitude = center
+        matches = []
+        for row in session.execute(self.bbox_query(bbox_around(latitude, longitude, radius_km))):
+            item = dict(zip(fields, row))
+            distance = haversine_km(latitude, longitude, item['latitude'], item['longitude'])
+            if distance <= radius_km:
+                item['distance_km'] = round(distance, 3)
+                matches.append(item)
+        matches.sort(key=lambda item: item['distance_km'])
+        return matches[offset:offset + limit]
@@ -0,0 +1,138 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Dict, Optional
+
+# Hebrew prepositions written as a prefix of the next word ("בתל אביב", "לחיפה")
+HEBREW_PREFIXES = 'בהוכלמש'
+
+
+class Geocoder:
+    """Offline geocoder resolving listing locations against a local gazetteer
+
+    The gazetteer is a CSV of cities and neighborhoods with coordinates and
+    aliases. Results, misses included, are kept in a SQLite cache keyed by the
+    normalised location text and the gazetteer checksum, so editing the
+    gazetteer invalidates old answers.
+    """
+
+    def __init__(self, gazetteer_path='gazetteer.csv', cache_path=os.path.join('data', 'geocode_cache.db')):
+        self.gazetteer_path = gazetteer_path
+        self.cache_path = cache_path
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.memory = {}
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        self.ensure_schema()
+        self.load_gazetteer()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    def ensure_schema(self):
+        """Create the cache table if it does not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    query TEXT NOT NULL,
+                    gazetteer TEXT NOT NULL,
+                    result TEXT,
+                    PRIMARY KEY (query, gazetteer)
+                )
+            """)
+
+    def load_gazetteer(self):
+        """Read places and compile one alias pattern, longest aliases first"""
+        with open(self.gazetteer_path, 'rb') as f:
+            self.checksum = hashlib.sha1(f.read()).hexdigest()[:12]
+
+        self.places = {}
+        aliases = {}
+        with open(self.gazetteer_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                place = {
+                    'name': row['name'],
+                    'city': row['parent'] or row['name'],
+                    'precision': 'neighborhood' if row['parent'] else 'city',
+                    'latitude': float(row['latitude']),
+                    'longitude': float(row['longitude'])
+                }
+                self.places[row['name']] = place
+                for alias in [row['name']] + [a for a in row['aliases'].split('|') if a]:
+                    aliases[self.normalize(alias)] = row['name']
+
+        self.aliases = aliases
+        alternatives = '|'.join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+        self.pattern = re.compile(rf"(?<!\w)[{HEBREW_PREFIXES}]?({alternatives})(?!\w)")
+        self.logger.info(f"Loaded {len(self.places)} gazetteer places ({self.checksum})")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r'\s+', ' ', text.replace('-', ' ')).strip().lower()
+
+    @staticmethod
+    def location_text(location: Any) -> str:
+        """Flatten a location (text, or a city/neighborhood dict possibly stored as JSON) to text"""
+        if isinstance(location, str) and location.startswith('{'):
+            try:
+                location = json.loads(location)
+            except ValueError:
+                pass
+        if isinstance(location, dict):
+            return ', '.join(str(location[key]) for key in ('neighborhood', 'city') if location.get(key))
+        return str(location or '')
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """Most specific gazetteer place mentioned in text
+
+        A neighborhood wins over its city; a neighborhood whose city conflicts
+        with a city also mentioned in the text is ignored.
+        """
+        found = [self.places[self.aliases[m.group(1)]] for m in self.pattern.finditer(text)]
+        cities = {place['city'] for place in found if place['precision'] == 'city'}
+        for place in found:
+            if place['precision'] == 'neighborhood' and (not cities or place['city'] in cities):
+                return place
+        for place in found:
+            if place['precision'] == 'city':
+                return place
+        return None
+
+    def geocode(self, location: Any) -> Optional[Dict[str, Any]]:
+        """Coordinates for a listing location, or None when no gazetteer place is mentioned"""
+        query = self.normalize(self.location_text(location))
+        if not query:
+            return None
+
+        with self.lock:
+            if query in self.memory:
+                return self.memory[query]
+
+        try:
+            with closing(self.connect()) as conn:
+                row = conn.execute(
+                    'SELECT result FROM geocode_cache WHERE query = ? AND gazetteer = ?',
+                    (query, self.checksum)
+                ).fetchone()
+            if row is not None:
+                result = json.loads(row[0]) if row[0] else None
+            else:
+                result = self.match(query)
+                with closing(self.connect()) as conn, conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO geocode_cache (query, gazetteer, result) VALUES (?, ?, ?)',
+                        (query, self.checksum, json.dumps(result, ensure_ascii=False) if result else None)
+                    )
+        except sqlite3.Error as e:
+            self.logger.error(f"Error reading geocode cache: {str(e)}")
+            result = self.match(query)
+
+        with self.lock:
+            self.memory[query] = result
+        return result
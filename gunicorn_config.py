@@ -1,6 +1,7 @@
 bind = "0.0.0.0:10000"
 workers = 4
-threads = 2
+# Each open /api/stream connection holds a thread
+threads = 16
 timeout = 120
 worker_class = "gthread"
 accesslog = "-"
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/css', 'application/javascript'}
+
+# Smaller bodies are not worth the CPU or the extra header
+MIN_COMPRESS_SIZE = 1024
+
+
+class ResponseCache:
+    """Small thread-safe LRU of encoded response bodies keyed by ETag and encoding"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def make_etag(version) -> str:
+    """ETag for the current request's URL at a data version"""
+    return hashlib.sha1(f"{request.full_path}|{version}".encode('utf-8')).hexdigest()[:20]
+
+
+def conditional(version_func):
+    """Serve a GET view with a weak ETag derived from version_func()
+
+    Requests whose If-None-Match holds the current ETag get a 304 without the
+    view running; repeat requests for an unchanged version reuse the cached body.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = make_etag(version_func())
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+
+            cached = response_cache.get((etag, 'identity'))
+            if cached:
+                body, mimetype = cached
+                response = Response(body, mimetype=mimetype)
+            else:
+                response = view(*args, **kwargs)
+                response = make_response(response)
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                response_cache.put((etag, 'identity'), (response.get_data(), response.mimetype))
+
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def choose_encoding():
+    """Best encoding the client accepts: br, then gzip, else None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request hook compressing large text responses"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    etag, _ = response.get_etag()
+    body = response_cache.get((etag, encoding)) if etag else None
+    if body is None:
+        if encoding == 'br':
+            body = brotli.compress(data, quality=5)
+        else:
+            body = gzip.compress(data, compresslevel=6)
+        if etag:
+            response_cache.put((etag, encoding), body)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Enable response compression for a Flask app"""
+    app.after_request(compress_response)
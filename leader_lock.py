@@ -0,0 +1,108 @@
+import logging
+import os
+import socket
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class LeaderLock:
+    """Exclusive OS file lock electing one process on the host as leader
+
+    Every process that could run the scheduler creates a LeaderLock with the
+    same name. One acquires the lock; the others stay on standby and retry.
+    The OS releases the lock when the leader exits or crashes, so a standby
+    takes over at its next retry without any stale-lock cleanup.
+    """
+
+    def __init__(self, name='scheduler', lock_dir='data', retry_interval=15):
+        self.path = os.path.join(lock_dir, f"{name}.lock")
+        self.retry_interval = retry_interval
+        self.logger = logging.getLogger(__name__)
+        self.handle = None
+        self.stop_event = threading.Event()
+        os.makedirs(lock_dir or '.', exist_ok=True)
+
+    @property
+    def is_leader(self) -> bool:
+        return self.handle is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock without blocking; True if this process is (now) the leader"""
+        if self.handle is not None:
+            return True
+
+        handle = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+
+        # Record the holder for operators; the lock itself is what counts
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{socket.gethostname()}:{os.getpid()}\n")
+        handle.flush()
+        self.handle = handle
+        self.logger.info(f"Acquired leader lock {self.path}")
+        return True
+
+    def holder(self) -> str:
+        """host:pid of the current leader as recorded in the lock file, if any"""
+        try:
+            with open(self.path) as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+    def release(self):
+        if self.handle is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError as e:
+            self.logger.error(f"Error releasing leader lock: {str(e)}")
+        finally:
+            self.handle.close()
+            self.handle = None
+            self.logger.info(f"Released leader lock {self.path}")
+
+    def wait(self) -> bool:
+        """Block until this process is leader or stop() is called"""
+        while not self.stop_event.is_set():
+            if self.try_acquire():
+                return True
+            self.logger.info(f"Standing by; leader is {self.holder() or 'unknown'}")
+            self.stop_event.wait(self.retry_interval)
+        return False
+
+    def run_when_leader(self, callback):
+        """Call callback once, from a daemon thread, after this process becomes leader"""
+        def elect():
+            if self.wait():
+                callback()
+
+        thread = threading.Thread(target=elect, name=f"leader-{os.path.basename(self.path)}", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
+        self.release()
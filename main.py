@@ -11,6 +11,8 @@ from processors.data_processor import CommercialPropertyProcessor
 
 class RealEstateOrchestrator:
     def __init__(self):
+        self.publish = None
+        self.new_counts = {}
         self.setup_logging()
         self.load_config()
         self.setup_processor()
@@ -37,6 +39,7 @@ class RealEstateOrchestrator:
     def setup_processor(self):
         """Setup data processor"""
         self.processor = CommercialPropertyProcessor()
+        self.processor.migrate_legacy_files()
 
     def setup_webdriver(self):
         """Setup Selenium WebDriver"""
@@ -55,17 +58,23 @@ class RealEstateOrchestrator:
             self.logger.error(f"Error setting up WebDriver: {str(e)}")
             raise
 
-    def scrape_facebook_groups(self):
-        """Scrape Facebook groups"""
+    def facebook_groups_config(self):
+        """The facebook_groups section, at the top level or under websites"""
+        return self.config.get('facebook_groups') or self.config.get('websites', {}).get('facebook_groups', {})
+
+    def scrape_facebook_groups(self, group_urls=None):
+        """Scrape Facebook groups, or only those whose URL is in group_urls"""
         try:
             driver = self.setup_webdriver()
             scraper = FacebookScraper(driver)
             
             all_properties = []
-            groups_config = self.config['facebook_groups']
+            groups_config = self.facebook_groups_config()
             
             # Scrape default groups
-            for group in groups_config['groups']:
+            for group in groups_config.get('groups', []):
+                if group_urls is not None and group['url'] not in group_urls:
+                    continue
                 try:
                     properties = scraper.scrape_group(
                         group['url'],
@@ -77,7 +86,9 @@ class RealEstateOrchestrator:
                     self.logger.error(f"Error scraping group {group['name']}: {str(e)}")
             
             # Scrape custom groups
-            for group in groups_config.get('custom_groups', []):
+            for group in groups_config.get('custom_groups') or []:
+                if group_urls is not None and group['url'] not in group_urls:
+                    continue
                 try:
                     properties = scraper.scrape_group(
                         group['url'],
@@ -111,30 +122,94 @@ class RealEstateOrchestrator:
             self.logger.error(f"Error in Yad2 scraping: {str(e)}")
             return []
 
-    def run(self):
-        """Run the orchestrator"""
+    def process_source(self, properties, source):
+        """Process and save listings that are new or changed since the last run"""
+        properties = self.processor.filter_changed(properties, source)
+        self.new_counts[source] = len(properties)
+        if not properties:
+            self.logger.info(f"No new or changed {source} listings")
+            return
+        
+        df = self.processor.process_properties(properties)
+        if self.processor.save_data(df, source):
+            self.processor.mark_processed(properties)
+            
+            # Let live dashboards show the new listings straight away
+            if self.publish:
+                self.publish('listings', {
+                    'source': source,
+                    'count': len(df),
+                    'listings': self.processor.summarize_listings(df, source)
+                })
+
+    def run(self, source='all', progress=None, publish=None, groups=None, analyze=True):
+        """Run the orchestrator; returns True if every stage completed
+
+        progress(fraction, stage) is called before each stage; returning False
+        from it stops the run there. publish(event_type, data) receives the
+        listings saved for each source. groups limits Facebook scraping to
+        those group URLs. new_counts holds new or changed listings per source.
+        With analyze=False the whole-store stages (run_analytics) are skipped.
+        """
+        self.publish = publish
+        self.new_counts = {}
+        def report(fraction, stage):
+            if progress and progress(fraction, stage) is False:
+                self.logger.info(f"Scraping process cancelled before {stage}")
+                return False
+            return True
+        
         try:
             self.logger.info("Starting scraping process")
             
             # Scrape Facebook groups
-            fb_properties = self.scrape_facebook_groups()
-            if fb_properties:
-                df = self.processor.process_properties(fb_properties)
-                self.processor.save_data(df, 'facebook')
+            if source in ('all', 'facebook'):
+                if not report(0.0, 'scraping facebook'):
+                    return False
+                self.process_source(self.scrape_facebook_groups(groups), 'facebook')
             
             # Scrape Yad2
-            yad2_properties = self.scrape_yad2()
-            if yad2_properties:
-                df = self.processor.process_properties(yad2_properties)
-                self.processor.save_data(df, 'yad2')
+            if source in ('all', 'yad2'):
+                if not report(0.4, 'scraping yad2'):
+                    return False
+                self.process_source(self.scrape_yad2(), 'yad2')
             
+        except Exception as e:
+            self.logger.error(f"Error in orchestrator: {str(e)}")
+            return False
+
+        if not analyze:
+            self.logger.info("Scraping process completed (analytics skipped)")
+            return True
+        return self.run_analytics(report)
+
+    def run_analytics(self, report=None):
+        """Analyze trends, publish the dashboard snapshot and compact storage; True if all completed"""
+        report = report or (lambda fraction, stage: True)
+        try:
             # Generate market analysis
+            if not report(0.8, 'analyzing market trends'):
+                return False
             self.processor.analyze_market_trends()
             
+            # Publish the analytics the dashboard serves
+            if not report(0.9, 'publishing analytics'):
+                return False
+            # Search criteria live in the web app's database, which the pipeline does
+            # not open; the snapshot leaves active_criteria unset (None)
+            self.processor.publish_analytics_snapshot()
+            
+            # Merge small files written by this and earlier runs
+            if not report(0.95, 'compacting storage'):
+                return False
+            self.processor.compact_storage()
+            
             self.logger.info("Scraping process completed")
+            return True
             
         except Exception as e:
             self.logger.error(f"Error in orchestrator: {str(e)}")
+            return False
 
 def main():
     orchestrator = RealEstateOrchestrator()
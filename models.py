@@ -10,16 +10,26 @@ class Property(db.Model):
     price = db.Column(db.Float)
     location = db.Column(db.String(200))
     size = db.Column(db.Float)
-    property_type = db.Column(db.String(50))
+    property_type = db.Column(db.String(50), index=True)
     url = db.Column(db.String(500), unique=True)
-    source_website = db.Column(db.String(100))
+    source_website = db.Column(db.String(100), index=True)
     description = db.Column(db.Text)
     amenities = db.Column(db.Text)
     contact_info = db.Column(db.String(200))
     date_listed = db.Column(db.DateTime)
-    date_scraped = db.Column(db.DateTime, default=datetime.utcnow)
+    date_scraped = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    point = db.relationship('PropertyLocation', uselist=False, cascade='all, delete-orphan', backref='property')
+
+class PropertyLocation(db.Model):
+    """Model for geocoded listing coordinates, indexed by geohash"""
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12), nullable=False, index=True)
+    place = db.Column(db.String(100))      # Gazetteer place the coordinates came from
+    precision = db.Column(db.String(20))   # city, neighborhood
 
 class SearchCriteria(db.Model):
     """Model for storing search criteria configurations"""
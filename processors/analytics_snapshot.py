@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+class AnalyticsSnapshotStore:
+    """Versioned dashboard analytics written once per pipeline run
+
+    Each publish writes snapshot_<version>.json and then points CURRENT at it,
+    both via a temp file and os.replace, so readers never see a partial
+    snapshot. Readers cache the parsed snapshot until CURRENT changes.
+    """
+
+    POINTER = 'CURRENT'
+
+    def __init__(self, base_dir: str, keep: int = 10):
+        self.base_dir = base_dir
+        self.keep = keep
+        self.logger = logging.getLogger(__name__)
+        self.cache_key = None
+        self.cache = None
+        self.lock = threading.Lock()
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def snapshot_path(self, version: int) -> str:
+        return os.path.join(self.base_dir, f'snapshot_{version:08d}.json')
+
+    def current_version(self) -> int:
+        """Version CURRENT points at (0 before the first publish)"""
+        try:
+            with open(os.path.join(self.base_dir, self.POINTER), 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def publish(self, snapshot: Dict[str, Any]) -> int:
+        """Write a new snapshot version and make it current"""
+        version = self.current_version() + 1
+        snapshot = dict(snapshot, version=version)
+
+        self._write_atomic(self.snapshot_path(version),
+                           json.dumps(snapshot, ensure_ascii=False, indent=2, default=str))
+        self._write_atomic(os.path.join(self.base_dir, self.POINTER), str(version))
+        self._prune(version)
+
+        self.logger.info(f"Published analytics snapshot v{version}")
+        return version
+
+    def load_latest(self) -> Optional[Dict[str, Any]]:
+        """Get the current snapshot, re-reading it only when CURRENT has changed"""
+        pointer = os.path.join(self.base_dir, self.POINTER)
+        try:
+            key = os.stat(pointer).st_mtime_ns
+        except OSError:
+            return None
+
+        with self.lock:
+            if key != self.cache_key:
+                version = self.current_version()
+                try:
+                    with open(self.snapshot_path(version), 'r', encoding='utf-8') as f:
+                        self.cache = json.load(f)
+                    self.cache_key = key
+                except (OSError, ValueError) as e:
+                    self.logger.error(f"Error loading analytics snapshot v{version}: {str(e)}")
+                    return self.cache
+            return self.cache
+
+    def _write_atomic(self, path: str, content: str):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _prune(self, version: int):
+        """Delete all but the newest `keep` snapshots"""
+        for file in os.listdir(self.base_dir):
+            if not (file.startswith('snapshot_') and file.endswith('.json')):
+                continue
+            try:
+                if int(file[len('snapshot_'):-len('.json')]) <= version - self.keep:
+                    os.remove(os.path.join(self.base_dir, file))
+            except (ValueError, OSError):
+                continue
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, date
+from typing import Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class ColumnarPropertyStore:
+    """Parquet dataset of processed properties, partitioned by source and date
+
+    Layout: <base_dir>/source=<source>/date=<YYYY-MM-DD>/part-*.parquet
+
+    Compaction writes a manifest naming the merged file and the files it
+    replaces before renaming the merged file into place. Once the merged file
+    exists, readers skip the replaced files, so a crash before they are deleted
+    never shows their rows twice; the next compaction finishes the cleanup.
+    """
+
+    MANIFEST = '_compaction.json'
+
+    # Typed columns shared by every source; anything else is stored as a string
+    SCHEMA = {
+        'title': pa.string(),
+        'price': pa.string(),
+        'size': pa.string(),
+        'location': pa.string(),
+        'property_type': pa.string(),
+        'url': pa.string(),
+        'description': pa.string(),
+        'price_normalized': pa.float64(),
+        'size_normalized': pa.float64(),
+        'price_per_sqm': pa.float64(),
+        'processed_at': pa.timestamp('us'),
+    }
+    PARTITION_COLUMNS = ('source', 'date')
+
+    def __init__(self, base_dir: str, compression: str = 'zstd',
+                 compact_min_files: int = 4):
+        self.base_dir = base_dir
+        self.compression = compression
+        self.compact_min_files = compact_min_files
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def partition_path(self, source: str, day: date) -> str:
+        """Get the directory of a single source/date partition"""
+        return os.path.join(self.base_dir, f'source={source}', f'date={day.isoformat()}')
+
+    def append(self, df: pd.DataFrame, source: str, day: Optional[date] = None) -> Optional[str]:
+        """Atomically append a DataFrame as a new file in its partition"""
+        if df.empty:
+            return None
+
+        day = day or datetime.now().date()
+        partition_dir = self.partition_path(source, day)
+        os.makedirs(partition_dir, exist_ok=True)
+
+        table = self._to_table(df)
+        path = os.path.join(partition_dir, self._file_name())
+        self._write_atomic(table, path)
+
+        self.logger.info(f"Appended {table.num_rows} rows to {partition_dir}")
+        return path
+
+    def read(self, columns: Optional[List[str]] = None, sources: Optional[Iterable[str]] = None,
+             start_date: Optional[date] = None, end_date: Optional[date] = None) -> pd.DataFrame:
+        """Read selected columns from the partitions matching sources and date range"""
+        frames = []
+        for source, day, partition_dir in self.list_partitions(sources, start_date, end_date):
+            for path in self._partition_files(partition_dir):
+                try:
+                    file_columns = self._existing_columns(path, columns)
+                    frame = pq.read_table(path, columns=file_columns).to_pandas()
+                except FileNotFoundError:
+                    # Replaced by a compaction after the partition was listed
+                    continue
+                frame['source'] = source
+                frame['date'] = day
+                frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(columns=list(columns or []) + list(self.PARTITION_COLUMNS))
+
+        return pd.concat(frames, ignore_index=True)
+
+    def list_partitions(self, sources: Optional[Iterable[str]] = None,
+                        start_date: Optional[date] = None, end_date: Optional[date] = None):
+        """List (source, date, path) for partitions matching the filters, without opening files"""
+        sources = set(sources) if sources else None
+        partitions = []
+
+        for source_dir in sorted(os.listdir(self.base_dir)):
+            if not source_dir.startswith('source='):
+                continue
+            source = source_dir.split('=', 1)[1]
+            if sources is not None and source not in sources:
+                continue
+
+            source_path = os.path.join(self.base_dir, source_dir)
+            for date_dir in sorted(os.listdir(source_path)):
+                if not date_dir.startswith('date='):
+                    continue
+                try:
+                    day = date.fromisoformat(date_dir.split('=', 1)[1])
+                except ValueError:
+                    continue
+                if start_date and day < start_date:
+                    continue
+                if end_date and day > end_date:
+                    continue
+                partitions.append((source, day, os.path.join(source_path, date_dir)))
+
+        return partitions
+
+    def compact(self, sources: Optional[Iterable[str]] = None) -> int:
+        """Merge small files within each partition into a single file"""
+        compacted = 0
+        for source, day, partition_dir in self.list_partitions(sources):
+            try:
+                self._finish_compaction(partition_dir)
+                files = self._partition_files(partition_dir)
+                if len(files) < self.compact_min_files:
+                    continue
+
+                tables = [pq.read_table(path) for path in files]
+                merged = pa.concat_tables(tables, promote_options='default')
+                merged_path = os.path.join(partition_dir, self._file_name('compacted'))
+                tmp_path = merged_path + '.tmp'
+                try:
+                    pq.write_table(merged, tmp_path, compression=self.compression)
+                    # The rename commits the compaction: from then on the manifest
+                    # hides the originals, whether or not they were deleted yet
+                    self._write_manifest(partition_dir, {
+                        'merged': os.path.basename(merged_path),
+                        'replaced': [os.path.basename(path) for path in files]
+                    })
+                    os.replace(tmp_path, merged_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self._finish_compaction(partition_dir)
+
+                compacted += 1
+                self.logger.info(f"Compacted {len(files)} files in {partition_dir}")
+            except Exception as e:
+                self.logger.error(f"Error compacting {partition_dir}: {str(e)}")
+
+        return compacted
+
+    def _read_manifest(self, partition_dir: str) -> Optional[dict]:
+        """The partition's compaction manifest, or None if there is none"""
+        try:
+            with open(os.path.join(partition_dir, self.MANIFEST), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, partition_dir: str, manifest: dict):
+        """Atomically write the partition's compaction manifest"""
+        path = os.path.join(partition_dir, self.MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def _finish_compaction(self, partition_dir: str):
+        """Delete the files a committed compaction replaced, or drop an uncommitted one"""
+        manifest = self._read_manifest(partition_dir)
+        if manifest is None:
+            return
+
+        merged_path = os.path.join(partition_dir, manifest['merged'])
+        if os.path.exists(merged_path):
+            for name in manifest['replaced']:
+                try:
+                    os.remove(os.path.join(partition_dir, name))
+                except FileNotFoundError:
+                    pass
+        elif os.path.exists(merged_path + '.tmp'):
+            # Crashed before the rename; the originals are still authoritative
+            os.remove(merged_path + '.tmp')
+        os.remove(os.path.join(partition_dir, self.MANIFEST))
+
+    def _file_name(self, suffix: str = '') -> str:
+        """Build a unique data file name"""
+        suffix = f'-{suffix}' if suffix else ''
+        return f"part-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:8]}{suffix}.parquet"
+
+    def _partition_files(self, partition_dir: str) -> List[str]:
+        """List finished data files in a partition, minus those a compaction replaced"""
+        names = {f for f in os.listdir(partition_dir) if f.endswith('.parquet')}
+        # Read after listing: if the listing has the merged file, the manifest
+        # is either still there or the replaced files are already gone
+        manifest = self._read_manifest(partition_dir)
+        if manifest and manifest['merged'] in names:
+            names -= set(manifest['replaced'])
+        return sorted(os.path.join(partition_dir, f) for f in names)
+
+    def _existing_columns(self, path: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+        """Restrict requested columns to those present in a file"""
+        if columns is None:
+            return None
+        file_columns = set(pq.read_schema(path).names)
+        return [c for c in columns if c in file_columns]
+
+    def _write_atomic(self, table: pa.Table, path: str):
+        """Write to a temporary file and rename it into place"""
+        tmp_path = path + '.tmp'
+        try:
+            pq.write_table(table, tmp_path, compression=self.compression)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        """Convert a processed DataFrame to an Arrow table with stable column types"""
+        df = df.drop(columns=[c for c in self.PARTITION_COLUMNS if c in df.columns])
+        arrays = {}
+
+        for column in df.columns:
+            arrow_type = self.SCHEMA.get(column, pa.string())
+            values = df[column]
+
+            if pa.types.is_floating(arrow_type):
+                values = pd.to_numeric(values, errors='coerce')
+            elif pa.types.is_timestamp(arrow_type):
+                values = pd.to_datetime(values, errors='coerce')
+            else:
+                values = values.map(self._to_text)
+
+            arrays[column] = pa.array(values, type=arrow_type, from_pandas=True)
+
+        return pa.table(arrays)
+
+    @staticmethod
+    def _to_text(value) -> Optional[str]:
+        """Serialize nested scraper fields (dicts, lists) as JSON text"""
+        if value is None:
+            return None
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        if isinstance(value, float) and pd.isna(value):
+            return None
+        return str(value)
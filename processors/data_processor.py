@@ -1,16 +1,35 @@
 import pandas as pd
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import os
+from collections import Counter
 from typing import List, Dict, Any
 import numpy as np
+from processors.columnar_store import ColumnarPropertyStore
+from processors.trend_store import MarketTrendStore
+from processors.listing_history import ListingHistory
+from processors.fingerprint_store import ListingFingerprintStore, UNCHANGED
+from processors.analytics_snapshot import AnalyticsSnapshotStore
+from sheets_outbox import SheetsOutbox
+from data_version import DataVersion
 
 class CommercialPropertyProcessor:
     def __init__(self, output_dir: str = 'data'):
         self.output_dir = output_dir
         self.setup_logging()
         self.ensure_directories()
+        self.store = ColumnarPropertyStore(os.path.join(self.output_dir, 'columnar'))
+        self.trends = MarketTrendStore(os.path.join(self.output_dir, 'analytics', 'daily'))
+        self.history = ListingHistory(os.path.join(self.output_dir, 'listing_history.db'))
+        self.fingerprints = ListingFingerprintStore(os.path.join(self.output_dir, 'fingerprints.db'))
+        self.snapshots = AnalyticsSnapshotStore(os.path.join(self.output_dir, 'analytics', 'snapshots'))
+        self.data_version = DataVersion(os.path.join(self.output_dir, 'data_version.db'))
+        
+        # Only queue rows for Google Sheets when a spreadsheet is configured
+        self.sheets_outbox = None
+        if os.getenv('SPREADSHEET_ID'):
+            self.sheets_outbox = SheetsOutbox(os.path.join(self.output_dir, 'sheets_outbox.db'))
         
     def setup_logging(self):
         """Setup logging configuration"""
@@ -25,8 +44,7 @@ class CommercialPropertyProcessor:
         """Ensure necessary directories exist"""
         directories = [
             self.output_dir,
-            os.path.join(self.output_dir, 'raw'),
-            os.path.join(self.output_dir, 'processed'),
+            os.path.join(self.output_dir, 'columnar'),
             os.path.join(self.output_dir, 'analytics')
         ]
         for directory in directories:
@@ -76,6 +94,23 @@ class CommercialPropertyProcessor:
             self.logger.error(f"Error normalizing size {size}: {str(e)}")
             return np.nan
 
+    def filter_changed(self, properties: List[Dict], source: str) -> List[Dict]:
+        """Drop listings that are unchanged since they were last processed"""
+        try:
+            labels = self.fingerprints.classify(properties)
+            self.logger.info(f"Fingerprints for {source}: {dict(Counter(labels))}")
+            return [p for p, label in zip(properties, labels) if label != UNCHANGED]
+        except Exception as e:
+            self.logger.error(f"Error checking fingerprints: {str(e)}")
+            return properties
+
+    def mark_processed(self, properties: List[Dict]):
+        """Remember fingerprints of listings that went through the pipeline"""
+        try:
+            self.fingerprints.mark_processed(properties)
+        except Exception as e:
+            self.logger.error(f"Error saving fingerprints: {str(e)}")
+
     def process_properties(self, properties: List[Dict]) -> pd.DataFrame:
         """Process list of properties into standardized DataFrame"""
         try:
@@ -98,25 +133,111 @@ class CommercialPropertyProcessor:
             return pd.DataFrame()
 
     def save_data(self, df: pd.DataFrame, source: str):
-        """Save processed data to files"""
+        """Save processed data to the columnar store; False if nothing was saved"""
+        if df is None or df.empty:
+            # process_properties returns an empty frame on failure; reporting
+            # success would let the caller fingerprint listings never stored
+            self.logger.warning(f"No processed {source} records to save")
+            return False
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             
-            # Save raw data
-            raw_path = os.path.join(self.output_dir, 'raw', f'{source}_{timestamp}.json')
-            df.to_json(raw_path, orient='records', force_ascii=False)
+            # Append to the source/date partition
+            self.store.append(df, source)
+            
+            # Fold into the daily trend aggregates
+            self.trends.update(df, source)
             
-            # Save processed data
-            processed_path = os.path.join(self.output_dir, 'processed', f'{source}_{timestamp}.csv')
-            df.to_csv(processed_path, index=False, encoding='utf-8-sig')
+            # Record price/status changes
+            self.history.record(df, source)
+            
+            # Queue rows for the background Sheets sync worker
+            if self.sheets_outbox:
+                self.sheets_outbox.enqueue([self._sheet_listing(r, source) for r in df.to_dict('records')])
             
             self.logger.info(f"Saved data for {source}: {len(df)} records")
             
+            # Invalidate ETags of API responses built from this data
+            self.data_version.bump()
+            
             # Generate analytics
             self.generate_analytics(df, source, timestamp)
+            return True
             
         except Exception as e:
             self.logger.error(f"Error saving data: {str(e)}")
+            return False
+
+    def _sheet_listing(self, record: Dict, source: str) -> Dict:
+        """Flatten a processed record into the scalar fields written to Sheets"""
+        def scalar(value):
+            if isinstance(value, (dict, list)):
+                return json.dumps(value, ensure_ascii=False)
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                return ''
+            return value
+        
+        return {
+            'title': scalar(record.get('title')),
+            'price': scalar(record.get('price_normalized')),
+            'location': MarketTrendStore.location_label(record.get('location')),
+            'size': scalar(record.get('size_normalized')),
+            'type': MarketTrendStore.type_label(record.get('property_type')),
+            'url': scalar(record.get('url')),
+            'source_website': source,
+            'description': scalar(record.get('description')),
+            'contact_info': scalar(record.get('contact_info'))
+        }
+
+    def summarize_listings(self, df: pd.DataFrame, source: str, limit: int = 100) -> List[Dict]:
+        """Flat scalar summaries of processed listings, e.g. for live update events"""
+        return [self._sheet_listing(r, source) for r in df.head(limit).to_dict('records')]
+
+    def load_properties(self, columns: List[str] = None, sources: List[str] = None,
+                        start_date=None, end_date=None) -> pd.DataFrame:
+        """Load stored properties, reading only the requested columns and partitions"""
+        try:
+            return self.store.read(columns, sources, start_date, end_date)
+        except Exception as e:
+            self.logger.error(f"Error loading properties: {str(e)}")
+            return pd.DataFrame()
+
+    def find_price_drops(self, days_back: int = 30, min_drop_pct: float = 0.0) -> List[Dict]:
+        """Find listings whose price dropped in the last days_back days"""
+        try:
+            return self.history.price_drops(days_back=days_back, min_drop_pct=min_drop_pct)
+        except Exception as e:
+            self.logger.error(f"Error finding price drops: {str(e)}")
+            return []
+
+    def compact_storage(self):
+        """Merge small files in the columnar store"""
+        try:
+            compacted = self.store.compact()
+            self.logger.info(f"Compacted {compacted} partitions")
+        except Exception as e:
+            self.logger.error(f"Error compacting storage: {str(e)}")
+
+    def migrate_legacy_files(self):
+        """Move CSV files written by earlier versions into the columnar store"""
+        processed_dir = os.path.join(self.output_dir, 'processed')
+        if not os.path.isdir(processed_dir):
+            return
+        
+        for file in sorted(os.listdir(processed_dir)):
+            if not file.endswith('.csv'):
+                continue
+            try:
+                # Files are named <source>_<YYYYmmdd>_<HHMMSS>.csv
+                source, day, _ = file[:-len('.csv')].rsplit('_', 2)
+                file_path = os.path.join(processed_dir, file)
+                df = pd.read_csv(file_path)
+                day = datetime.strptime(day, '%Y%m%d').date()
+                self.store.append(df, source, day)
+                self.trends.update(df, source, day)
+                os.remove(file_path)
+            except Exception as e:
+                self.logger.error(f"Error migrating {file}: {str(e)}")
 
     def generate_analytics(self, df: pd.DataFrame, source: str, timestamp: str):
         """Generate analytics from processed data"""
@@ -158,38 +279,34 @@ class CommercialPropertyProcessor:
             self.logger.error(f"Error generating analytics: {str(e)}")
 
     def analyze_market_trends(self, days_back: int = 30):
-        """Analyze market trends from historical data"""
+        """Analyze market trends over the last days_back days"""
         try:
-            # Get all processed files
-            processed_dir = os.path.join(self.output_dir, 'processed')
-            all_files = os.listdir(processed_dir)
-            
-            # Combine recent files
-            dfs = []
-            for file in all_files:
-                if file.endswith('.csv'):
-                    file_path = os.path.join(processed_dir, file)
-                    df = pd.read_csv(file_path)
-                    dfs.append(df)
-            
-            if not dfs:
+            end_date = datetime.now().date()
+            start_date = end_date - timedelta(days=days_back - 1)
+            
+            # Read one aggregate file per day instead of every stored row
+            summary = self.trends.query(start_date, end_date)
+            if not summary['total_properties']:
                 return
             
-            # Combine all data
-            combined_df = pd.concat(dfs, ignore_index=True)
+            price = summary['metrics']['price_normalized']
+            price_per_sqm = summary['metrics']['price_per_sqm']
             
             # Calculate trends
             trends = {
+                'days_back': days_back,
+                'total_properties': summary['total_properties'],
                 'price_trend': {
-                    'mean_change': self._calculate_trend(combined_df, 'price_normalized'),
-                    'median_change': self._calculate_trend(combined_df, 'price_normalized', 'median')
+                    'mean_change': price['mean'],
+                    'median_change': price['median']
                 },
                 'price_per_sqm_trend': {
-                    'mean_change': self._calculate_trend(combined_df, 'price_per_sqm'),
-                    'median_change': self._calculate_trend(combined_df, 'price_per_sqm', 'median')
+                    'mean_change': price_per_sqm['mean'],
+                    'median_change': price_per_sqm['median']
                 },
-                'popular_areas': combined_df['location'].value_counts().head(10).to_dict(),
-                'popular_types': combined_df['property_type'].value_counts().head(5).to_dict()
+                'popular_areas': self._top_counts(summary['locations'], 10),
+                'popular_types': self._top_counts(summary['property_types'], 5),
+                'daily': summary['daily']
             }
             
             # Save trends
@@ -199,16 +316,59 @@ class CommercialPropertyProcessor:
                 json.dump(trends, f, ensure_ascii=False, indent=2)
             
             self.logger.info("Generated market trends analysis")
+            return trends
             
         except Exception as e:
             self.logger.error(f"Error analyzing market trends: {str(e)}")
 
-    def _calculate_trend(self, df: pd.DataFrame, column: str, method: str = 'mean') -> float:
-        """Calculate trend for a specific column"""
+    def publish_analytics_snapshot(self, days_back: int = 30, active_criteria: int = None):
+        """Write the dashboard analytics snapshot served by /api/data and /api/statistics"""
         try:
-            if method == 'mean':
-                return df[column].mean()
-            elif method == 'median':
-                return df[column].median()
-        except Exception:
-            return 0.0
+            now = datetime.now()
+            end_date = now.date()
+            start_date = end_date - timedelta(days=days_back - 1)
+            # Listing counts are distinct URLs seen in the window; price and size
+            # statistics come from the trend aggregates, which weigh every save
+            summary = self.trends.query(start_date, end_date)
+            listings = self.history.summary(end_date.isoformat(), start_date.isoformat())
+            
+            price = summary['metrics']['price_normalized']
+            size = summary['metrics']['size_normalized']
+            snapshot = {
+                'generated_at': now.isoformat(timespec='seconds'),
+                'last_update': now.strftime('%Y-%m-%d %H:%M:%S'),
+                'days_back': days_back,
+                'total_properties': listings['total'],
+                'new_today': listings['new_since'],
+                'active_criteria': active_criteria,
+                'sources': listings['sources'],
+                'avg_price': price['mean'] if price['mean'] is not None else 'N/A',
+                'median_price': price['median'],
+                'avg_size': size['mean'] if size['mean'] is not None else 'N/A',
+                'avg_price_per_sqm': summary['metrics']['price_per_sqm']['mean'],
+                'locations': self._top_counts(listings['locations'], 5),
+                'property_types': self._top_counts(listings['property_types'], 20),
+                'daily': listings['daily'],
+                'observations': summary['total_properties']
+            }
+            version = self.snapshots.publish(snapshot)
+            self.data_version.bump()
+            return version
+            
+        except Exception as e:
+            self.logger.error(f"Error publishing analytics snapshot: {str(e)}")
+
+    def rebuild_trend_aggregates(self):
+        """Rebuild the daily trend aggregates from the columnar store"""
+        columns = ['property_type', 'location'] + list(MarketTrendStore.METRICS)
+        for source, day, _ in self.store.list_partitions():
+            try:
+                df = self.store.read(columns, sources=[source], start_date=day, end_date=day)
+                self.trends.clear_source(day, source)
+                self.trends.update(df, source, day)
+            except Exception as e:
+                self.logger.error(f"Error rebuilding trends for {source} on {day}: {str(e)}")
+
+    def _top_counts(self, counts: Dict[str, int], limit: int) -> Dict[str, int]:
+        """Get the most frequent entries of a count dict"""
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit])
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, List
+
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+class ListingFingerprintStore:
+    """Compact URL -> fingerprint store used to skip unchanged scraped listings
+
+    Fingerprints are taken over the raw scraped record, before normalization, so
+    unchanged listings can be dropped before any downstream work is done.
+    """
+
+    # Fields that change between scrapes without the listing itself changing
+    VOLATILE_FIELDS = ('scraped_at', 'processed_at', 'posted_date', 'group_url', 'images')
+
+    # Keep IN (...) lists under SQLite's bound parameter limit
+    BATCH_SIZE = 500
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self.ensure_schema()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def ensure_schema(self):
+        """Create the fingerprint table if it does not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS listing_fingerprints (
+                    url TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    last_seen TEXT NOT NULL
+                )
+            """)
+
+    @classmethod
+    def fingerprint(cls, record: Dict[str, Any]) -> str:
+        """Hash a raw scraped record, ignoring volatile fields"""
+        stable = {k: v for k, v in record.items() if k not in cls.VOLATILE_FIELDS}
+        payload = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def classify(self, records: List[Dict[str, Any]]) -> List[str]:
+        """Label each record new, changed or unchanged against the stored fingerprints"""
+        known = self._lookup([r['url'] for r in records if r.get('url')])
+
+        labels = []
+        for record in records:
+            url = record.get('url')
+            if not url or url not in known:
+                # Listings without a URL cannot be matched, so treat them as new
+                labels.append(NEW)
+            elif known[url] == self.fingerprint(record):
+                labels.append(UNCHANGED)
+            else:
+                labels.append(CHANGED)
+        return labels
+
+    def mark_processed(self, records: List[Dict[str, Any]]):
+        """Store fingerprints for records that made it through the pipeline"""
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = [(r['url'], self.fingerprint(r), now) for r in records if r.get('url')]
+        if not rows:
+            return
+
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                'INSERT INTO listing_fingerprints (url, fingerprint, last_seen) VALUES (?, ?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET fingerprint = excluded.fingerprint, '
+                'last_seen = excluded.last_seen',
+                rows
+            )
+
+    def _lookup(self, urls: List[str]) -> Dict[str, str]:
+        """Fetch stored fingerprints for the given URLs"""
+        known = {}
+        with closing(self.connect()) as conn:
+            for i in range(0, len(urls), self.BATCH_SIZE):
+                batch = urls[i:i + self.BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT url, fingerprint FROM listing_fingerprints WHERE url IN ({placeholders})',
+                    batch
+                ).fetchall()
+                known.update(rows)
+        return known
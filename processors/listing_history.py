@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from processors.trend_store import MarketTrendStore
+
+
+class ListingHistory:
+    """Price/status history of listings, written only when a listing's content changes
+
+    listing_state keeps the latest content hash per URL; price_history gets a compact
+    row (price, status, hash) each time that hash changes, so re-scraping an
+    unchanged listing writes nothing.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self.ensure_schema()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ensure_schema(self):
+        """Create tables if they do not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS listing_state (
+                    url TEXT PRIMARY KEY,
+                    source TEXT,
+                    content_hash TEXT NOT NULL,
+                    price REAL,
+                    status TEXT,
+                    first_seen TEXT NOT NULL,
+                    last_seen TEXT NOT NULL,
+                    last_changed TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS price_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    observed_at TEXT NOT NULL,
+                    price REAL,
+                    status TEXT,
+                    content_hash TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_price_history_url
+                    ON price_history (url, observed_at);
+            """)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(listing_state)')}
+            for column in ('location', 'property_type'):
+                if column not in columns:
+                    # Tables created before the dashboard counted listings by label
+                    conn.execute(f'ALTER TABLE listing_state ADD COLUMN {column} TEXT')
+
+    @classmethod
+    def content_hash(cls, record: Dict[str, Any]) -> str:
+        """Hash the normalized fields of a processed listing"""
+        normalized = {
+            'title': cls._text(record.get('title')),
+            'price_normalized': cls._number(record.get('price_normalized')),
+            'size_normalized': cls._number(record.get('size_normalized')),
+            'location': MarketTrendStore.location_label(record.get('location')),
+            'property_type': MarketTrendStore.type_label(record.get('property_type')),
+            'description': cls._text(record.get('description')),
+            'status': cls._text(record.get('status')) or 'active'
+        }
+        payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def record(self, df: pd.DataFrame, source: str) -> Dict[str, int]:
+        """Record a processed batch, adding history rows only for new or changed listings"""
+        counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+        if df.empty or 'url' not in df:
+            return counts
+
+        now = datetime.now().isoformat(timespec='seconds')
+        # Rows without a URL come back from the DataFrame as NaN
+        records = [r for r in df.to_dict('records') if isinstance(r.get('url'), str) and r['url']]
+
+        with closing(self.connect()) as conn, conn:
+            for record in records:
+                url = record['url']
+                content_hash = self.content_hash(record)
+                price = self._number(record.get('price_normalized'))
+                status = self._text(record.get('status')) or 'active'
+                location = MarketTrendStore.location_label(record.get('location'))
+                property_type = MarketTrendStore.type_label(record.get('property_type'))
+
+                row = conn.execute(
+                    'SELECT content_hash FROM listing_state WHERE url = ?', (url,)
+                ).fetchone()
+
+                if row is not None and row['content_hash'] == content_hash:
+                    conn.execute('UPDATE listing_state SET last_seen = ? WHERE url = ?', (now, url))
+                    counts['unchanged'] += 1
+                    continue
+
+                if row is None:
+                    conn.execute(
+                        'INSERT INTO listing_state (url, source, content_hash, price, status, location, '
+                        'property_type, first_seen, last_seen, last_changed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (url, source, content_hash, price, status, location, property_type, now, now, now)
+                    )
+                    counts['new'] += 1
+                else:
+                    conn.execute(
+                        'UPDATE listing_state SET content_hash = ?, price = ?, status = ?, location = ?, '
+                        'property_type = ?, last_seen = ?, last_changed = ? WHERE url = ?',
+                        (content_hash, price, status, location, property_type, now, now, url)
+                    )
+                    counts['changed'] += 1
+
+                conn.execute(
+                    'INSERT INTO price_history (url, observed_at, price, status, content_hash) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (url, now, price, status, content_hash)
+                )
+
+        self.logger.info(f"Listing history for {source}: {counts}")
+        return counts
+
+    def get_history(self, url: str) -> List[Dict[str, Any]]:
+        """Get the recorded price/status changes of a listing, oldest first"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT observed_at, price, status FROM price_history '
+                'WHERE url = ? ORDER BY observed_at, id', (url,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def price_drops(self, days_back: Optional[int] = None, min_drop_pct: float = 0.0,
+                    source: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Find listings whose price went down, largest relative drop first"""
+        since = None
+        if days_back is not None:
+            since = (datetime.now() - timedelta(days=days_back)).isoformat(timespec='seconds')
+
+        query = """
+            WITH changes AS (
+                SELECT url, observed_at, price,
+                       LAG(price) OVER (PARTITION BY url ORDER BY observed_at, id) AS previous_price
+                FROM price_history
+            )
+            SELECT c.url, s.source, c.observed_at, c.previous_price, c.price,
+                   (c.previous_price - c.price) / c.previous_price * 100.0 AS drop_pct
+            FROM changes c JOIN listing_state s ON s.url = c.url
+            WHERE c.previous_price > 0 AND c.price < c.previous_price
+              AND (c.previous_price - c.price) / c.previous_price * 100.0 >= ?
+        """
+        params = [min_drop_pct]
+        if since:
+            query += ' AND c.observed_at >= ?'
+            params.append(since)
+        if source:
+            query += ' AND s.source = ?'
+            params.append(source)
+        query += ' ORDER BY drop_pct DESC LIMIT ?'
+        params.append(limit)
+
+        with closing(self.connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self, since: str, seen_since: Optional[str] = None) -> Dict[str, Any]:
+        """Count distinct listings seen at or after `seen_since` (all if None)
+
+        Returns the total, those first seen at or after `since`, counts per
+        source, location and property type, and new listings per first-seen day.
+        Every count is over the same set of URLs, so the figures add up.
+        """
+        where, params = ('WHERE last_seen >= ?', (seen_since,)) if seen_since else ('', ())
+
+        def counts(column):
+            rows = conn.execute(
+                f"SELECT COALESCE({column}, 'unknown'), COUNT(*) FROM listing_state {where} GROUP BY 1",
+                params
+            ).fetchall()
+            return {row[0]: row[1] for row in rows}
+
+        with closing(self.connect()) as conn:
+            total, new = conn.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(first_seen >= ?), 0) FROM listing_state {where}',
+                (since,) + params
+            ).fetchone()
+            daily = conn.execute(
+                f'SELECT substr(first_seen, 1, 10), COUNT(*), AVG(price) FROM listing_state {where} '
+                f'{"AND" if where else "WHERE"} first_seen >= ? GROUP BY 1 ORDER BY 1',
+                params + (seen_since or '',)
+            ).fetchall()
+            return {
+                'total': total,
+                'new_since': new,
+                'sources': counts('source'),
+                'locations': counts('location'),
+                'property_types': counts('property_type'),
+                'daily': {row[0]: {'new': row[1], 'mean_price': row[2]} for row in daily}
+            }
+
+    @staticmethod
+    def _text(value: Any) -> Optional[str]:
+        if value is None or (isinstance(value, float) and pd.isna(value)):
+            return None
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, sort_keys=True, ensure_ascii=False)
+        return str(value).strip()
+
+    @staticmethod
+    def _number(value: Any) -> Optional[float]:
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if pd.isna(value) or value in (float('inf'), float('-inf')) else round(value, 2)
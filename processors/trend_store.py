@@ -0,0 +1,294 @@
+import json
+import logging
+import math
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class QuantileSketch:
+    """Mergeable log-bucket histogram with bounded relative error (DDSketch-style)"""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = defaultdict(int)
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        """Add a value to the sketch"""
+        if value <= 0:
+            self.zero_count += count
+        else:
+            self.bins[math.ceil(math.log(value) / self.log_gamma)] += count
+
+    def merge(self, other: 'QuantileSketch'):
+        """Merge another sketch with the same accuracy into this one"""
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1)"""
+        total = self.count
+        if not total:
+            return None
+
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'zero': self.zero_count,
+            'bins': {str(key): count for key, count in self.bins.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], relative_accuracy: float = 0.01) -> 'QuantileSketch':
+        sketch = cls(relative_accuracy)
+        sketch.zero_count = data.get('zero', 0)
+        for key, count in data.get('bins', {}).items():
+            sketch.bins[int(key)] = count
+        return sketch
+
+
+class MarketTrendStore:
+    """Persisted per-day aggregates of processed properties
+
+    One JSON file per day holds a cell per (source, property type, location) with
+    counts, sums, min/max and a quantile sketch for each tracked metric, so a trend
+    query over N days reads N small files regardless of how many rows were scraped.
+    Updates hold an exclusive file lock per day, so processes folding in rows for
+    the same day at once do not lose each other's counts.
+    """
+
+    METRICS = ('price_normalized', 'size_normalized', 'price_per_sqm')
+
+    def __init__(self, base_dir: str, relative_accuracy: float = 0.01):
+        self.base_dir = base_dir
+        self.relative_accuracy = relative_accuracy
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def day_path(self, day: date) -> str:
+        return os.path.join(self.base_dir, f'{day.isoformat()}.json')
+
+    def update(self, df: pd.DataFrame, source: str, day: Optional[date] = None):
+        """Fold a processed DataFrame into the aggregates for its day"""
+        if df.empty:
+            return
+
+        day = day or date.today()
+        with self._day_lock(day):
+            self._update_day(df, source, day)
+        self.logger.info(f"Updated trend aggregates for {source} on {day.isoformat()}")
+
+    def _update_day(self, df: pd.DataFrame, source: str, day: date):
+        """Read, fold into and rewrite a day's cells; the caller holds the day's lock"""
+        cells = self.load_day(day)
+
+        types = df['property_type'].map(self.type_label) if 'property_type' in df else pd.Series('unknown', index=df.index)
+        locations = df['location'].map(self.location_label) if 'location' in df else pd.Series('unknown', index=df.index)
+
+        for (property_type, location), group in df.groupby([types, locations]):
+            key = '|'.join([source, property_type, location])
+            cell = cells.setdefault(key, self._empty_cell(source, property_type, location))
+            cell['count'] += len(group)
+
+            for metric in self.METRICS:
+                if metric not in group:
+                    continue
+                values = pd.to_numeric(group[metric], errors='coerce')
+                values = values[values.notna() & ~values.isin([float('inf'), float('-inf')])]
+                if values.empty:
+                    continue
+
+                stats = cell['metrics'].setdefault(metric, self._empty_metric())
+                stats['n'] += len(values)
+                stats['sum'] += float(values.sum())
+                stats['min'] = float(values.min()) if stats['min'] is None else min(stats['min'], float(values.min()))
+                stats['max'] = float(values.max()) if stats['max'] is None else max(stats['max'], float(values.max()))
+
+                sketch = QuantileSketch.from_dict(stats['sketch'], self.relative_accuracy)
+                for value in values:
+                    sketch.add(float(value))
+                stats['sketch'] = sketch.to_dict()
+
+        self._save_day(day, cells)
+
+    def load_day(self, day: date) -> Dict[str, Dict]:
+        """Load the aggregate cells for a single day"""
+        path = self.day_path(day)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def clear_source(self, day: date, source: str):
+        """Remove a source's cells for a day, e.g. before refolding them"""
+        with self._day_lock(day):
+            cells = self.load_day(day)
+            if cells:
+                self._save_day(day, {k: v for k, v in cells.items() if v['source'] != source})
+
+    def query(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """Summarize the aggregates for every day in [start_date, end_date]"""
+        totals = {metric: self._empty_metric() for metric in self.METRICS}
+        sketches = {metric: QuantileSketch(self.relative_accuracy) for metric in self.METRICS}
+        locations = defaultdict(int)
+        property_types = defaultdict(int)
+        sources = defaultdict(int)
+        daily = {}
+
+        day = start_date
+        while day <= end_date:
+            day_count = 0
+            day_price = self._empty_metric()
+            for cell in self.load_day(day).values():
+                day_count += cell['count']
+                locations[cell['location']] += cell['count']
+                property_types[cell['property_type']] += cell['count']
+                sources[cell['source']] += cell['count']
+
+                for metric, stats in cell['metrics'].items():
+                    if metric not in totals:
+                        continue
+                    self._merge_metric(totals[metric], stats)
+                    sketches[metric].merge(QuantileSketch.from_dict(stats['sketch'], self.relative_accuracy))
+                    if metric == 'price_normalized':
+                        self._merge_metric(day_price, stats)
+
+            if day_count:
+                daily[day.isoformat()] = {
+                    'count': day_count,
+                    'mean_price': day_price['sum'] / day_price['n'] if day_price['n'] else None
+                }
+            day += timedelta(days=1)
+
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'total_properties': sum(sources.values()),
+            'metrics': {
+                metric: {
+                    'count': totals[metric]['n'],
+                    'mean': totals[metric]['sum'] / totals[metric]['n'] if totals[metric]['n'] else None,
+                    'median': sketches[metric].quantile(0.5),
+                    'p25': sketches[metric].quantile(0.25),
+                    'p75': sketches[metric].quantile(0.75),
+                    'min': totals[metric]['min'],
+                    'max': totals[metric]['max']
+                }
+                for metric in self.METRICS
+            },
+            'locations': dict(locations),
+            'property_types': dict(property_types),
+            'sources': dict(sources),
+            'daily': daily
+        }
+
+    @staticmethod
+    def type_label(value: Any) -> str:
+        """Reduce a scraped property type (string or Facebook type dict) to a label"""
+        value = MarketTrendStore._decode(value)
+        if isinstance(value, dict):
+            value = value.get('english') or value.get('type')
+        if value is None or (isinstance(value, float) and pd.isna(value)) or value == '':
+            return 'unknown'
+        return str(value)
+
+    @staticmethod
+    def location_label(value: Any) -> str:
+        """Reduce a scraped location (string or city/neighborhood dict) to a label"""
+        value = MarketTrendStore._decode(value)
+        if isinstance(value, dict):
+            value = value.get('city') or value.get('neighborhood')
+        if value is None or (isinstance(value, float) and pd.isna(value)) or value == '':
+            return 'unknown'
+        return str(value)
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        """Decode dict fields that were stored as JSON text"""
+        if isinstance(value, str) and value.startswith('{'):
+            try:
+                return json.loads(value)
+            except ValueError:
+                pass
+        return value
+
+    @contextmanager
+    def _day_lock(self, day: date):
+        """Hold an exclusive OS lock on a day's file across a read-modify-write"""
+        with open(self.day_path(day) + '.lock', 'a+') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _save_day(self, day: date, cells: Dict[str, Dict]):
+        """Atomically replace a day's aggregate file"""
+        path = self.day_path(day)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cells, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _empty_cell(source: str, property_type: str, location: str) -> Dict[str, Any]:
+        return {
+            'source': source,
+            'property_type': property_type,
+            'location': location,
+            'count': 0,
+            'metrics': {}
+        }
+
+    @staticmethod
+    def _empty_metric() -> Dict[str, Any]:
+        return {'n': 0, 'sum': 0.0, 'min': None, 'max': None, 'sketch': {}}
+
+    @staticmethod
+    def _merge_metric(target: Dict[str, Any], stats: Dict[str, Any]):
+        target['n'] += stats['n']
+        target['sum'] += stats['sum']
+        if stats['min'] is not None:
+            target['min'] = stats['min'] if target['min'] is None else min(target['min'], stats['min'])
+        if stats['max'] is not None:
+            target['max'] = stats['max'] if target['max'] is None else max(target['max'], stats['max'])
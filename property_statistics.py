@@ -0,0 +1,148 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, and_, cast, func, literal, select
+
+from models import Property, SearchCriteria, ScrapingLog
+
+
+class PropertyStatistics:
+    """Dashboard statistics computed with SQL aggregates over Property
+
+    Results are cached per data version, so repeated requests between writes
+    cost a dictionary lookup.
+    """
+
+    # Group columns reported by the endpoint
+    DIMENSIONS = {
+        'by_type': Property.property_type,
+        'by_source': Property.source_website,
+        'by_location': Property.location
+    }
+
+    def __init__(self, session, top_locations=20, days=30):
+        self.session = session
+        self.top_locations = top_locations
+        self.days = days
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def get(self, version):
+        """Statistics for a data version, computed once per version"""
+        with self.lock:
+            if version in self.cache:
+                return self.cache[version]
+        stats = self.compute()
+        with self.lock:
+            # Only the current version is ever asked for again
+            self.cache = {version: stats}
+        return stats
+
+    def compute(self):
+        session = self.session
+        now = datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        total, avg_price, avg_size, newest = session.execute(
+            select(
+                func.count(Property.id),
+                func.avg(Property.price),
+                func.avg(Property.size),
+                func.max(Property.date_scraped)
+            )
+        ).one()
+        new_today = session.execute(
+            select(func.count(Property.id)).where(Property.date_scraped >= today)
+        ).scalar()
+        active_criteria = session.execute(
+            select(func.count(SearchCriteria.id)).where(SearchCriteria.is_active.is_(True))
+        ).scalar()
+        last_log = session.execute(select(func.max(ScrapingLog.end_time))).scalar()
+        last_update = max((t for t in (newest, last_log) if t), default=None)
+
+        stats = {
+            'total_properties': total,
+            'new_today': new_today,
+            'active_criteria': active_criteria,
+            'last_update': last_update.isoformat() if last_update else None,
+            'avg_price': avg_price,
+            'avg_size': avg_size,
+            'median_price': self.median_price(),
+            'new_per_day': self.new_per_day(now - timedelta(days=self.days))
+        }
+        for name, column in self.DIMENSIONS.items():
+            limit = self.top_locations if name == 'by_location' else None
+            stats[name] = self.group_stats(column, limit)
+        return stats
+
+    def group_stats(self, column, limit=None):
+        """Count, average price/size and median price per value of column, largest groups first"""
+        session = self.session
+        query = (
+            select(
+                column.label('key'),
+                func.count(Property.id).label('count'),
+                func.avg(Property.price).label('avg_price'),
+                func.avg(Property.size).label('avg_size')
+            )
+            .group_by(column)
+            .order_by(func.count(Property.id).desc())
+        )
+        if limit:
+            query = query.limit(limit)
+
+        groups = {}
+        for key, count, avg_price, avg_size in session.execute(query):
+            groups[key if key is not None else 'unknown'] = {
+                'count': count,
+                'avg_price': avg_price,
+                'avg_size': avg_size,
+                'median_price': None
+            }
+
+        for key, median in self.median_price_by(column):
+            key = key if key is not None else 'unknown'
+            if key in groups:
+                groups[key]['median_price'] = median
+        return groups
+
+    def median_price(self):
+        medians = self.median_price_by(None)
+        return medians[0][1] if medians else None
+
+    def median_price_by(self, column):
+        """Median price per group, using window functions so only the middle rows are returned"""
+        partition = [column] if column is not None else []
+        ranked = (
+            select(
+                *(c.label('key') for c in partition),
+                Property.price.label('price'),
+                func.row_number().over(partition_by=partition, order_by=Property.price).label('rn'),
+                func.count().over(partition_by=partition).label('n')
+            )
+            .where(Property.price.isnot(None))
+            .subquery()
+        )
+
+        # Rows floor((n + 1) / 2) and floor(n / 2) + 1 are the middle one or two
+        # rows; cast because SQLAlchemy 2.0 compiles / as true division
+        middle = and_(
+            ranked.c.rn >= cast((ranked.c.n + 1) / 2, Integer),
+            ranked.c.rn <= cast(ranked.c.n / 2, Integer) + 1
+        )
+        if column is not None:
+            query = select(ranked.c.key, func.avg(ranked.c.price)).where(middle).group_by(ranked.c.key)
+        else:
+            query = select(literal(None), func.avg(ranked.c.price)).where(middle)
+        return [(key, median) for key, median in self.session.execute(query) if median is not None]
+
+    def new_per_day(self, since):
+        """Listings scraped per day since `since`"""
+        day = func.date(Property.date_scraped)
+        rows = self.session.execute(
+            select(day, func.count(Property.id))
+            .where(Property.date_scraped >= since)
+            .group_by(day)
+            .order_by(day)
+        )
+        return {str(d): count for d, count in rows}
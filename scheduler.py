@@ -1,18 +1,108 @@
+from apscheduler.events import EVENT_JOB_EXECUTED
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
 import logging
-from main import RealEstateOrchestrator
+import os
+import yaml
+from adaptive_schedule import AdaptiveSchedule
+from leader_lock import LeaderLock
+from scrape_watermarks import ScrapeWatermarks
 import signal
 import sys
 import time
 
+JOBSTORE_PATH = os.path.join('data', 'scheduler.db')
+CONFIG_PATH = 'websites_config.yaml'
+ANALYTICS_JOB_ID = 'analytics'
+# Gap between the first runs of targets scheduled together, so they do not all start at once
+STAGGER = timedelta(minutes=2)
+
+def interval_trigger(seconds, start_date=None):
+    """Interval trigger with up to 10% (at most 10 minutes) of random jitter"""
+    return IntervalTrigger(seconds=seconds, start_date=start_date, jitter=int(min(seconds * 0.1, 600)))
+
+def load_config():
+    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+def scrape_targets(config):
+    """Scheduled targets: Yad2, plus each configured Facebook group on its own
+
+    Each target is its own job with its own interval, so a busy group is
+    checked often without dragging quiet ones (or Yad2) along.
+    """
+    groups = config.get('facebook_groups') or config.get('websites', {}).get('facebook_groups', {})
+    targets = ['yad2']
+    for group in (groups.get('groups') or []) + (groups.get('custom_groups') or []):
+        targets.append(f"facebook:{group['url']}")
+    return targets
+
+def run_source(target):
+    """Scheduled job: scrape one target, record the outcome and adapt its interval
+
+    Module-level so the persistent job store can reference it by name.
+    Returns the number of new listings (0 if the run failed). Whole-store
+    analytics are left to the separate run_analytics job.
+    """
+    # Imported here so the job store can load this module without Selenium
+    from main import RealEstateOrchestrator
+
+    logger = logging.getLogger(__name__)
+    new_listings = 0
+    source, _, group = target.partition(':')
+    watermarks = ScrapeWatermarks(JOBSTORE_PATH)
+    watermarks.record_start(target)
+    try:
+        logger.info(f"Starting scheduled {target} scraping at {datetime.now()}")
+        orchestrator = RealEstateOrchestrator()
+        if orchestrator.run(source=source, groups=[group] if group else None, analyze=False):
+            watermarks.record_success(target)
+            new_listings = orchestrator.new_counts.get(source, 0)
+            AdaptiveSchedule.from_config(orchestrator.config, JOBSTORE_PATH).record_run(target, new_listings)
+            logger.info(f"Completed scheduled {target} scraping at {datetime.now()}")
+        else:
+            watermarks.record_failure(target, 'Scrape finished with errors, see orchestrator.log')
+    except Exception as e:
+        logger.error(f"Error in scheduled {target} scraping: {str(e)}")
+        watermarks.record_failure(target, str(e))
+    return new_listings
+
+def run_analytics():
+    """Scheduled job: market analysis, dashboard snapshot and storage compaction over all sources"""
+    from main import RealEstateOrchestrator
+
+    logger = logging.getLogger(__name__)
+    try:
+        logger.info(f"Starting scheduled analytics at {datetime.now()}")
+        RealEstateOrchestrator().run_analytics()
+    except Exception as e:
+        logger.error(f"Error in scheduled analytics: {str(e)}")
+
 class ScraperScheduler:
-    def __init__(self):
+    def __init__(self, misfire_grace_time=None, leader=None):
         self.setup_logging()
-        self.scheduler = BackgroundScheduler()
-        self.orchestrator = RealEstateOrchestrator()
-        self.setup_signal_handlers()
+        # Job state lives in SQLite, so a restart keeps next run times and
+        # runs missed while down (once, within the grace time). A single
+        # worker thread runs jobs one at a time, so targets never compete for
+        # browsers or write the same source's files concurrently.
+        self.scheduler = BackgroundScheduler(
+            jobstores={'default': SQLAlchemyJobStore(url=f"sqlite:///{JOBSTORE_PATH}")},
+            executors={'default': ThreadPoolExecutor(1)},
+            job_defaults={
+                'coalesce': True,
+                'max_instances': 1,
+                'misfire_grace_time': misfire_grace_time or int(os.getenv('SCRAPE_MISFIRE_GRACE', '3600'))
+            }
+        )
+        self.config = load_config()
+        self.targets = scrape_targets(self.config)
+        self.watermarks = ScrapeWatermarks(JOBSTORE_PATH)
+        self.adaptive = AdaptiveSchedule.from_config(self.config, JOBSTORE_PATH)
+        # app.py passes the lock it already holds
+        self.leader = leader or LeaderLock('scrape-scheduler')
         
     def setup_logging(self):
         """Setup logging configuration"""
@@ -31,43 +121,97 @@ class ScraperScheduler:
     def handle_shutdown(self, signum, frame):
         """Handle shutdown signals"""
         self.logger.info("Received shutdown signal. Stopping scheduler...")
-        self.scheduler.shutdown()
+        if self.scheduler.running:
+            self.scheduler.shutdown()
+        self.leader.stop()
         sys.exit(0)
 
-    def run_scraper(self):
-        """Run the scraper"""
-        try:
-            self.logger.info(f"Starting scheduled scraping at {datetime.now()}")
-            self.orchestrator.run()
-            self.logger.info(f"Completed scheduled scraping at {datetime.now()}")
-        except Exception as e:
-            self.logger.error(f"Error in scheduled scraping: {str(e)}")
+    def schedule_jobs(self):
+        """Give every target an interval job, keeping persisted next run times"""
+        job_ids = {f"scrape_{target}": target for target in self.targets}
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith('scrape_') and job.id not in job_ids:
+                # Target removed from the config, or a job from the fixed cron schedule
+                self.logger.info(f"Removing job {job.id}")
+                job.remove()
 
-    def start(self):
-        """Start the scheduler"""
-        try:
-            # Schedule scraping jobs
-            # Run every 3 hours during business hours (8 AM to 8 PM)
+        now = datetime.now()
+        new_jobs = 0
+        for job_id, target in job_ids.items():
+            seconds = self.adaptive.interval(target)
+            job = self.scheduler.get_job(job_id)
+            if job and isinstance(job.trigger, IntervalTrigger):
+                self.logger.info(f"Resuming persisted job {job_id}")
+                continue
+            if job:
+                job.remove()
+
+            start_date = now + timedelta(seconds=seconds) + new_jobs * STAGGER
+            new_jobs += 1
             self.scheduler.add_job(
-                self.run_scraper,
-                CronTrigger(
-                    hour='8-20/3',  # Every 3 hours from 8 AM to 8 PM
-                    minute='0',     # At the start of the hour
-                    day_of_week='mon-fri'  # Monday to Friday
-                ),
-                id='regular_scraping'
+                'scheduler:run_source',
+                interval_trigger(seconds, start_date),
+                args=[target],
+                id=job_id,
+                name=f"Scrape {target}"
             )
-            
-            # Add an immediate run
+            self.logger.info(f"Scheduled {target} every {seconds / 60:.0f} min")
+
+        if not self.scheduler.get_job(ANALYTICS_JOB_ID):
+            # Fallback cadence; scrapes that find new listings also pull it forward
             self.scheduler.add_job(
-                self.run_scraper,
-                'date',
-                run_date=datetime.now(),
-                id='immediate_run'
+                'scheduler:run_analytics',
+                IntervalTrigger(hours=6),
+                id=ANALYTICS_JOB_ID,
+                name='Market analytics'
             )
-            
-            self.scheduler.start()
-            self.logger.info("Scheduler started successfully")
+
+    def adapt_interval(self, event):
+        """After a run, move the job onto the interval its new-listing rate calls for
+
+        A run that found new listings also queues the analytics job, which the
+        single worker runs once after any scrapes already waiting.
+        """
+        if not event.job_id.startswith('scrape_'):
+            return
+        if event.retval:
+            self.scheduler.modify_job(ANALYTICS_JOB_ID, next_run_time=datetime.now())
+        target = event.job_id[len('scrape_'):]
+        job = self.scheduler.get_job(event.job_id)
+        seconds = self.adaptive.interval(target)
+        if job and abs(job.trigger.interval.total_seconds() - seconds) >= 60:
+            self.scheduler.reschedule_job(event.job_id, trigger=interval_trigger(seconds))
+            self.logger.info(f"Rescheduled {target} every {seconds / 60:.0f} min")
+
+    def run_never_scraped(self):
+        """Run soon, staggered, any target that has never completed a scrape"""
+        now = datetime.now()
+        pending = [target for target in self.targets if self.watermarks.last_success(target) is None]
+        for index, target in enumerate(pending):
+            # Moving the existing job keeps max_instances=1 in force
+            self.scheduler.modify_job(f"scrape_{target}", next_run_time=now + index * STAGGER)
+
+    def start_jobs(self):
+        """Start running the scrape jobs in the background; the caller must hold the leader lock"""
+        self.scheduler.add_listener(self.adapt_interval, EVENT_JOB_EXECUTED)
+        # Jobs are added while paused so persisted runs do not fire before setup finishes
+        self.scheduler.start(paused=True)
+        self.schedule_jobs()
+        self.run_never_scraped()
+        self.scheduler.resume()
+        self.logger.info("Scheduler started successfully")
+
+    def start(self):
+        """Start the scheduler"""
+        try:
+            self.setup_signal_handlers()
+
+            # Only one process (this or python app.py) may run scrapes;
+            # the others wait here and take over if the leader exits
+            if not self.leader.wait():
+                return
+            self.logger.info("Acquired scheduler leadership")
+            self.start_jobs()
             
             # Keep the script running
             try:
@@ -0,0 +1,395 @@
+import json
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Job states; QUEUED and RUNNING count as active
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+SOURCES = ('all', 'facebook', 'yad2')
+
+# Events kept for reconnecting stream clients
+MAX_EVENTS = 5000
+
+# Running jobs refresh heartbeat_at this often; a job silent for STALE_AFTER
+# seconds is taken to have lost its worker, whichever host it ran on
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = int(os.getenv('SCRAPE_JOB_STALE_AFTER', '300'))
+
+
+class DuplicateJobError(Exception):
+    """Raised when a scrape is requested while another one is queued or running"""
+
+    def __init__(self, job):
+        super().__init__(f"Scrape job {job['id']} is already {job['status']}")
+        self.job = job
+
+
+class ScrapeJobStore:
+    """SQLite-backed scrape job queue shared by the web workers and the job workers
+
+    Every gunicorn worker and every job worker process sees the same jobs, so a
+    status request can land on any worker.
+    """
+
+    def __init__(self, db_path=os.path.join('data', 'scrape_jobs.db')):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.ensure_schema()
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ensure_schema(self):
+        """Create the jobs table if it does not exist"""
+        with closing(self.connect()) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scrape_jobs (
+                    id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    stage TEXT,
+                    message TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    heartbeat_at TEXT,
+                    finished_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS scrape_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+            """)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(scrape_jobs)')}
+            if 'heartbeat_at' not in columns:
+                # Tables created before heartbeats existed
+                conn.execute('ALTER TABLE scrape_jobs ADD COLUMN heartbeat_at TEXT')
+
+    @contextmanager
+    def transaction(self):
+        """Connection inside BEGIN IMMEDIATE, committed on success and rolled back on error
+
+        IMMEDIATE takes the write lock up front, so two processes cannot both
+        read the same state and act on it.
+        """
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def enqueue(self, source='all') -> Dict[str, Any]:
+        """Queue a scrape; raises DuplicateJobError while another one is active"""
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source: {source}")
+
+        job_id = uuid.uuid4().hex
+        with self.transaction() as conn:
+            self._fail_stale(conn)
+            active = conn.execute(
+                'SELECT * FROM scrape_jobs WHERE status IN (?, ?) ORDER BY created_at LIMIT 1',
+                ACTIVE_STATES
+            ).fetchone()
+            if active:
+                raise DuplicateJobError(dict(active))
+            conn.execute(
+                'INSERT INTO scrape_jobs (id, source, status, stage, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, source, QUEUED, 'queued', self._now())
+            )
+            job = self._publish_job(conn, job_id)
+
+        self.logger.info(f"Queued scrape job {job_id} for {source}")
+        return job
+
+    def get(self, job_id) -> Optional[Dict[str, Any]]:
+        with closing(self.connect()) as conn:
+            row = conn.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_recent(self, limit=20) -> List[Dict[str, Any]]:
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT * FROM scrape_jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_next(self, worker) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running for this worker"""
+        with self.transaction() as conn:
+            self._fail_stale(conn)
+            row = conn.execute(
+                'SELECT id FROM scrape_jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if not row:
+                return None
+            now = self._now()
+            conn.execute(
+                'UPDATE scrape_jobs SET status = ?, stage = ?, worker = ?, started_at = ?, heartbeat_at = ? WHERE id = ?',
+                (RUNNING, 'starting', worker, now, now, row['id'])
+            )
+            return self._publish_job(conn, row['id'])
+
+    def update_progress(self, job_id, progress, stage):
+        """Record progress (0-1) and the current stage; returns False once cancel was requested"""
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE scrape_jobs SET progress = ?, stage = ?, heartbeat_at = ? WHERE id = ?',
+                (round(progress, 3), stage, self._now(), job_id)
+            )
+            job = self._publish_job(conn, job_id)
+        return not (job and job['cancel_requested'])
+
+    def heartbeat(self, job_id):
+        """Mark a running job as still alive"""
+        with closing(self.connect()) as conn:
+            conn.execute(
+                'UPDATE scrape_jobs SET heartbeat_at = ? WHERE id = ? AND status = ?',
+                (self._now(), job_id, RUNNING)
+            )
+
+    def _fail_stale(self, conn):
+        """Fail running jobs whose heartbeat is older than STALE_AFTER, in the caller's transaction"""
+        cutoff = (datetime.now() - timedelta(seconds=STALE_AFTER)).isoformat(timespec='seconds')
+        rows = conn.execute(
+            'SELECT id FROM scrape_jobs WHERE status = ? AND COALESCE(heartbeat_at, started_at, created_at) < ?',
+            (RUNNING, cutoff)
+        ).fetchall()
+        for row in rows:
+            conn.execute(
+                'UPDATE scrape_jobs SET status = ?, stage = ?, message = ?, finished_at = ? WHERE id = ?',
+                (FAILED, FAILED, f'No heartbeat from the worker for {STALE_AFTER}s', self._now(), row['id'])
+            )
+            self._publish_job(conn, row['id'])
+        if rows:
+            self.logger.warning(f"Marked {len(rows)} scrape jobs without a heartbeat as failed")
+
+    def request_cancel(self, job_id) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job at once, or ask a running one to stop at its next stage"""
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE scrape_jobs SET status = ?, stage = ?, finished_at = ? WHERE id = ? AND status = ?',
+                (CANCELLED, 'cancelled', self._now(), job_id, QUEUED)
+            )
+            conn.execute(
+                'UPDATE scrape_jobs SET cancel_requested = 1 WHERE id = ? AND status = ?',
+                (job_id, RUNNING)
+            )
+            return self._publish_job(conn, job_id)
+
+    def finish(self, job_id, status, message=None):
+        """Record the outcome of a job"""
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE scrape_jobs SET status = ?, stage = ?, message = ?, finished_at = ?, '
+                'progress = CASE WHEN ? = ? THEN 1 ELSE progress END WHERE id = ?',
+                (status, status, message, self._now(), status, SUCCEEDED, job_id)
+            )
+            self._publish_job(conn, job_id)
+
+    def _publish_job(self, conn, job_id) -> Optional[Dict[str, Any]]:
+        """Record the job's state as a 'job' event in the caller's transaction and return it"""
+        row = conn.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        self._insert_event(conn, 'job', job)
+        return job
+
+    def add_event(self, event_type, data):
+        """Record an event for the live stream"""
+        with closing(self.connect()) as conn:
+            return self._insert_event(conn, event_type, data)
+
+    def _insert_event(self, conn, event_type, data):
+        cursor = conn.execute(
+            'INSERT INTO scrape_events (type, payload, created_at) VALUES (?, ?, ?)',
+            (event_type, json.dumps(data, ensure_ascii=False, default=str), self._now())
+        )
+        # Trim the oldest events now and then
+        if cursor.lastrowid % 100 == 0:
+            conn.execute('DELETE FROM scrape_events WHERE id <= ?', (cursor.lastrowid - MAX_EVENTS,))
+        return cursor.lastrowid
+
+    def events_since(self, last_id, limit=500) -> List[Dict[str, Any]]:
+        """Events after last_id, oldest first"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT id, type, payload FROM scrape_events WHERE id > ? ORDER BY id LIMIT ?',
+                (last_id or 0, limit)
+            ).fetchall()
+        return [{'id': row['id'], 'type': row['type'], 'data': json.loads(row['payload'])} for row in rows]
+
+    def last_event_id(self) -> int:
+        with closing(self.connect()) as conn:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) FROM scrape_events').fetchone()[0]
+
+    def recover_stale(self, hostname):
+        """Fail jobs left running by a process on this host that no longer exists"""
+        with self.transaction() as conn:
+            rows = conn.execute(
+                'SELECT id, worker FROM scrape_jobs WHERE status = ? AND worker LIKE ?',
+                (RUNNING, f'{hostname}:%')
+            ).fetchall()
+            stale = [row['id'] for row in rows if not self._process_alive(int(row['worker'].split(':')[1]))]
+            for job_id in stale:
+                conn.execute(
+                    'UPDATE scrape_jobs SET status = ?, stage = ?, message = ?, finished_at = ? WHERE id = ?',
+                    (FAILED, FAILED, 'Worker stopped before the job finished', self._now(), job_id)
+                )
+                self._publish_job(conn, job_id)
+        if stale:
+            self.logger.warning(f"Marked {len(stale)} interrupted scrape jobs as failed")
+
+    @staticmethod
+    def _process_alive(pid):
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec='seconds')
+
+
+class ScrapeWorkerPool:
+    """Threads that claim queued scrape jobs and run them through the orchestrator"""
+
+    def __init__(self, store: ScrapeJobStore, workers=1, poll_interval=2.0):
+        self.setup_logging()
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def setup_logging(self):
+        """Setup logging configuration"""
+        logging.basicConfig(
+            filename='scrape_jobs.log',
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+        self.logger = logging.getLogger(__name__)
+
+    def worker_name(self, index):
+        return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+    def run_job(self, job):
+        """Run one job to completion, failure or cancellation"""
+        # Imported here so the web tier can enqueue jobs without loading Selenium
+        from main import RealEstateOrchestrator
+
+        job_id = job['id']
+        self.logger.info(f"Running scrape job {job_id} ({job['source']})")
+
+        # Stages can run for many minutes between progress updates
+        done = threading.Event()
+        def beat():
+            while not done.wait(HEARTBEAT_INTERVAL):
+                try:
+                    self.store.heartbeat(job_id)
+                except Exception as e:
+                    self.logger.error(f"Error recording heartbeat for job {job_id}: {str(e)}")
+        threading.Thread(target=beat, name=f'scrape-heartbeat-{job_id[:8]}', daemon=True).start()
+
+        try:
+            orchestrator = RealEstateOrchestrator()
+            completed = orchestrator.run(
+                source=job['source'],
+                progress=lambda fraction, stage: self.store.update_progress(job_id, fraction, stage),
+                publish=self.store.add_event
+            )
+            if self.store.get(job_id)['cancel_requested']:
+                self.store.finish(job_id, CANCELLED, 'Cancelled by request')
+            elif completed:
+                self.store.finish(job_id, SUCCEEDED)
+            else:
+                self.store.finish(job_id, FAILED, 'Scrape finished with errors, see orchestrator.log')
+        except Exception as e:
+            self.logger.error(f"Error running scrape job {job_id}: {str(e)}")
+            self.store.finish(job_id, FAILED, str(e))
+        finally:
+            done.set()
+
+    def work(self, index):
+        """Claim and run jobs until stopped"""
+        name = self.worker_name(index)
+        while not self.stop_event.is_set():
+            try:
+                job = self.store.claim_next(name)
+            except Exception as e:
+                self.logger.error(f"Error claiming scrape job: {str(e)}")
+                job = None
+            if job:
+                self.run_job(job)
+            else:
+                self.stop_event.wait(self.poll_interval)
+
+    def start(self):
+        """Start the worker threads"""
+        if any(t.is_alive() for t in self.threads):
+            return
+        self.store.recover_stale(socket.gethostname())
+        self.stop_event.clear()
+        self.threads = [
+            threading.Thread(target=self.work, args=(i,), name=f'scrape-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+        self.logger.info(f"Started {self.workers} scrape workers")
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait for running ones to finish"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+def main():
+    pool = ScrapeWorkerPool(ScrapeJobStore(), workers=int(os.getenv('SCRAPE_WORKERS', 1)))
+
+    def handle_shutdown(signum, frame):
+        pool.stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    pool.start()
+    pool.stop_event.wait()
+    pool.stop()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
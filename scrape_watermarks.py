@@ -0,0 +1,71 @@
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class ScrapeWatermarks:
+    """Per-source record of the last scheduled scrape attempt and last success"""
+
+    def __init__(self, db_path=os.path.join('data', 'scheduler.db')):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.ensure_schema()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ensure_schema(self):
+        """Create the watermark table if it does not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_watermarks (
+                    source TEXT PRIMARY KEY,
+                    last_attempt TEXT,
+                    last_success TEXT,
+                    last_status TEXT,
+                    last_error TEXT
+                )
+            """)
+
+    def _record(self, source, status, error=None, success=False):
+        now = datetime.now().isoformat(timespec='seconds')
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO scrape_watermarks (source, last_attempt, last_success, last_status, last_error)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    last_attempt = excluded.last_attempt,
+                    last_success = COALESCE(excluded.last_success, last_success),
+                    last_status = excluded.last_status,
+                    last_error = excluded.last_error
+                """,
+                (source, now, now if success else None, status, error)
+            )
+
+    def record_start(self, source):
+        self._record(source, 'running')
+
+    def record_success(self, source):
+        self._record(source, 'succeeded', success=True)
+
+    def record_failure(self, source, error):
+        self._record(source, 'failed', error=error)
+
+    def get(self, source) -> Optional[Dict]:
+        with closing(self.connect()) as conn:
+            row = conn.execute('SELECT * FROM scrape_watermarks WHERE source = ?', (source,)).fetchone()
+        return dict(row) if row else None
+
+    def last_success(self, source) -> Optional[datetime]:
+        """Time of the source's last successful run, or None if it never succeeded"""
+        row = self.get(source)
+        if row and row['last_success']:
+            return datetime.fromisoformat(row['last_success'])
+        return None
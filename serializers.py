@@ -0,0 +1,72 @@
+import json
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+from sqlalchemy import select
+
+from models import Property
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Columns exposed by the property APIs, in output order
+PROPERTY_COLUMNS = (
+    Property.id,
+    Property.title,
+    Property.price,
+    Property.location,
+    Property.size,
+    Property.property_type,
+    Property.url,
+    Property.source_website,
+    Property.date_scraped
+)
+PROPERTY_FIELDS = tuple(column.key for column in PROPERTY_COLUMNS)
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    """Encode to JSON bytes with orjson when available, handling datetimes either way"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(obj, status=200) -> Response:
+    """Flask response with a body encoded by dumps()"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def property_query(limit=None, offset=0):
+    """Newest properties first, selecting only the API columns as row tuples"""
+    query = select(*PROPERTY_COLUMNS).order_by(Property.date_scraped.desc()).offset(offset)
+    return query if limit is None else query.limit(limit)
+
+
+def property_rows(session, limit=100, offset=0):
+    """Properties as dicts built straight from row tuples, without ORM objects"""
+    rows = session.execute(property_query(limit, offset))
+    return [dict(zip(PROPERTY_FIELDS, row)) for row in rows]
+
+
+def ndjson_response(session, query, fields, batch_size=1000) -> Response:
+    """Stream query rows as newline-delimited JSON, fetching batch_size rows at a time"""
+    def generate():
+        rows = session.execute(query, execution_options={'yield_per': batch_size})
+        buffer = []
+        for row in rows:
+            buffer.append(dumps(dict(zip(fields, row))))
+            if len(buffer) >= batch_size:
+                yield b'\n'.join(buffer) + b'\n'
+                buffer = []
+        if buffer:
+            yield b'\n'.join(buffer) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -11,6 +11,7 @@ setup(
         'beautifulsoup4',
         'requests',
         'pandas',
+        'pyarrow',
         'python-dotenv',
         'aiohttp',
         'selenium',
@@ -0,0 +1,147 @@
+"""Measure GoogleSheetsHandler throughput against the local fake Sheets API.
+
+Scenarios, each run at several sheet sizes (in cells, 11 columns per row):
+  append       - every listing is new
+  dedup-cold   - 90% of the batch is already in the sheet; empty URL index, so the
+                 URL column is read in full first
+  dedup-warm   - same batch with the URL index already synced
+  upsert       - every listing exists, 10% of them changed
+
+Usage: python sheets_benchmark.py --sizes 10000 100000 1000000 --batch 1000 --latency 0.05
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from fake_sheets_server import FakeSheetsServer
+from sheets_handler import GoogleSheetsHandler
+
+SPREADSHEET_ID = 'benchmark'
+SHEET_NAME = 'Listings'
+COLUMNS = len(GoogleSheetsHandler.HEADERS)
+
+
+def make_listing(i, price=None):
+    """Build a synthetic listing"""
+    return {
+        'title': f'Office space {i}',
+        'price': price if price is not None else 10000 + i,
+        'location': 'Tel Aviv',
+        'size': 100 + i % 400,
+        'type': 'office',
+        'url': f'https://example.com/listing/{i}',
+        'source_website': 'benchmark',
+        'description': 'Synthetic listing used by sheets_benchmark.py',
+        'contact_info': '050-0000000',
+        'last_updated': '2024-01-01 00:00:00'
+    }
+
+
+class SheetsBenchmark:
+    """Run the benchmark scenarios against a FakeSheetsServer"""
+
+    def __init__(self, latency=0.0, quota_per_minute=None, batch_size=1000):
+        self.server = FakeSheetsServer(latency=latency, quota_per_minute=quota_per_minute)
+        self.batch_size = batch_size
+        self.work_dir = tempfile.mkdtemp(prefix='sheets_benchmark_')
+
+    def new_handler(self, index_name):
+        # The fake server enforces its own quota, so the client-side limiter is opened up
+        return GoogleSheetsHandler(
+            None,
+            index_path=os.path.join(self.work_dir, f'{index_name}.db'),
+            requests_per_minute=1_000_000,
+            api_endpoint=self.server.url
+        )
+
+    def populate(self, rows, handler=None):
+        """Fill the sheet with header + rows listings directly in the server's store"""
+        store = self.server.store
+        with store.lock:
+            store.spreadsheets.pop(SPREADSHEET_ID, None)
+            store.get_book(SPREADSHEET_ID)
+            store.add_sheet(SPREADSHEET_ID, {'title': SHEET_NAME, 'sheetId': 1,
+                                             'gridProperties': {'frozenRowCount': 1}})
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            sheet_rows = store.get_sheet(SPREADSHEET_ID, SHEET_NAME)['rows']
+            sheet_rows.append(list(GoogleSheetsHandler.HEADERS))
+            for i in range(rows):
+                listing = make_listing(i)
+                sheet_rows.append([now] + [
+                    listing[key] for key in ('title', 'price', 'location', 'size', 'type', 'url',
+                                             'source_website', 'description', 'contact_info', 'last_updated')
+                ])
+
+    def timed(self, func):
+        requests_before = self.server.request_count
+        started = time.perf_counter()
+        result = func()
+        return time.perf_counter() - started, self.server.request_count - requests_before, result
+
+    def run_size(self, cells):
+        """Run every scenario for a sheet holding roughly `cells` cells"""
+        rows = max(cells // COLUMNS, self.batch_size)
+        results = []
+
+        # append: sheet starts at the target size, the whole batch is new
+        self.populate(rows)
+        handler = self.new_handler(f'append_{cells}')
+        batch = [make_listing(rows + i) for i in range(self.batch_size)]
+        results.append(('append', *self.timed(lambda: handler.update_sheet(SPREADSHEET_ID, batch, SHEET_NAME))))
+
+        # dedup: 90% of the batch is already in the sheet
+        self.populate(rows)
+        existing = int(self.batch_size * 0.9)
+        batch = [make_listing(rows - existing + i) for i in range(self.batch_size)]
+        handler = self.new_handler(f'dedup_{cells}')
+        results.append(('dedup-cold', *self.timed(lambda: handler.update_sheet(SPREADSHEET_ID, batch, SHEET_NAME))))
+
+        self.populate(rows)
+        handler.url_index.reset(SPREADSHEET_ID, SHEET_NAME)
+        handler.sync_url_index(SPREADSHEET_ID, SHEET_NAME)
+        results.append(('dedup-warm', *self.timed(lambda: handler.update_sheet(SPREADSHEET_ID, batch, SHEET_NAME))))
+
+        # upsert: every listing exists, one in ten has a new price
+        self.populate(rows)
+        handler = self.new_handler(f'upsert_{cells}')
+        first = rows - self.batch_size
+        handler.upsert_sheet(SPREADSHEET_ID, [make_listing(first + i) for i in range(self.batch_size)], SHEET_NAME)
+        batch = [
+            make_listing(first + i, price=1 if i % 10 == 0 else None)
+            for i in range(self.batch_size)
+        ]
+        results.append(('upsert', *self.timed(lambda: handler.upsert_sheet(SPREADSHEET_ID, batch, SHEET_NAME))))
+
+        return rows, results
+
+    def run(self, sizes):
+        self.server.start()
+        try:
+            print(f"{'cells':>10} {'rows':>8} {'scenario':<11} {'seconds':>8} {'requests':>8} {'rows/s':>10}")
+            for cells in sizes:
+                rows, results = self.run_size(cells)
+                for scenario, seconds, requests, _ in results:
+                    rate = self.batch_size / seconds if seconds else float('inf')
+                    print(f"{cells:>10} {rows:>8} {scenario:<11} {seconds:>8.2f} {requests:>8} {rate:>10.0f}")
+        finally:
+            self.server.stop()
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Sheets writes against a local fake API')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='sheet sizes in cells')
+    parser.add_argument('--batch', type=int, default=1000, help='listings per write')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every API request')
+    parser.add_argument('--quota', type=int, default=None, help='server-side requests per minute')
+    args = parser.parse_args()
+
+    SheetsBenchmark(args.latency, args.quota, args.batch).run(args.sizes)
+
+
+if __name__ == '__main__':
+    main()
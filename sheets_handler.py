@@ -2,15 +2,50 @@ from google.oauth2.credentials import Credentials
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import httplib2
 import pandas as pd
+import json
 import logging
+import random
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime
+from sheets_index import SheetUrlIndex
+from sheets_shards import SheetShardRouter
+from sheets_writer import (
+    TokenBucket, execute_with_retry, backoff_delay, chunk_rows,
+    DEFAULT_REQUESTS_PER_MINUTE, RETRYABLE_STATUSES, REJECTED_STATUSES
+)
 
 class GoogleSheetsHandler:
-    def __init__(self, credentials_path):
-        """Initialize Google Sheets API client"""
+    # Listing URLs live in column G
+    URL_COLUMN = 'G'
+    
+    HEADERS = [
+        'Date Added', 'Title', 'Price', 'Location', 'Size', 'Type',
+        'URL', 'Source', 'Description', 'Contact Info', 'Last Updated'
+    ]
+    HEADER_FORMAT = {
+        'backgroundColor': {'red': 0.8, 'green': 0.8, 'blue': 0.8},
+        'textFormat': {'bold': True}
+    }
+    
+    # Appends resent after a server error, each after re-checking which rows landed
+    MAX_APPEND_RETRIES = 5
+    
+    # Only fetch what the metadata cache needs from spreadsheets.get
+    METADATA_FIELDS = 'sheets(properties(sheetId,title,gridProperties(frozenRowCount)))'
+
+    def __init__(self, credentials_path, index_path='sheets_index.db',
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, api_endpoint=None, shard_policy=None):
+        """Initialize Google Sheets API client; pass a ShardPolicy to spread listings over shards"""
         self.setup_logging()
-        self.setup_credentials(credentials_path)
+        self.setup_credentials(credentials_path, api_endpoint)
+        self.url_index = SheetUrlIndex(index_path)
+        self.metadata_cache = {}
+        self.rate_limiter = TokenBucket(requests_per_minute)
+        self.shard_router = SheetShardRouter(self, shard_policy) if shard_policy else None
         
     def setup_logging(self):
         """Configure logging"""
@@ -20,9 +55,21 @@ class GoogleSheetsHandler:
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
         
-    def setup_credentials(self, credentials_path):
+    def setup_credentials(self, credentials_path, api_endpoint=None):
         """Set up Google Sheets API credentials"""
         try:
+            if api_endpoint:
+                # Unauthenticated client for a local API such as fake_sheets_server.py
+                self.creds = None
+                self.service = build(
+                    'sheets', 'v4',
+                    http=httplib2.Http(),
+                    client_options={'api_endpoint': api_endpoint},
+                    static_discovery=True
+                )
+                self.sheets = self.service.spreadsheets()
+                return
+
             SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
             self.creds = service_account.Credentials.from_service_account_file(
                 credentials_path, scopes=SCOPES)
@@ -32,6 +79,10 @@ class GoogleSheetsHandler:
             logging.error(f"Error setting up Google Sheets credentials: {str(e)}")
             raise
             
+    def _execute(self, request):
+        """Execute an API request under the rate limit, retrying quota and server errors"""
+        return execute_with_retry(request, self.rate_limiter)
+
     def create_sheet(self, spreadsheet_id, sheet_name):
         """Create a new sheet in the spreadsheet"""
         try:
@@ -43,12 +94,19 @@ class GoogleSheetsHandler:
                 }
             }
             body = {'requests': [request]}
-            response = self.sheets.batchUpdate(
+            response = self._execute(self.sheets.batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body=body
-            ).execute()
+            ))
+            
+            # Add the new sheet to the cache instead of refetching metadata
+            for reply in response.get('replies', []):
+                if 'addSheet' in reply:
+                    self._cache_sheet(spreadsheet_id, reply['addSheet']['properties'])
             return response
         except HttpError as e:
+            # Our cached view of the spreadsheet is out of date either way
+            self.invalidate_metadata(spreadsheet_id)
             if 'already exists' in str(e):
                 logging.warning(f"Sheet '{sheet_name}' already exists")
             else:
@@ -57,171 +115,516 @@ class GoogleSheetsHandler:
                 
     def setup_headers(self, spreadsheet_id, sheet_name):
         """Set up headers in the sheet"""
-        headers = [
-            'Date Added', 'Title', 'Price', 'Location', 'Size', 'Type',
-            'URL', 'Source', 'Description', 'Contact Info', 'Last Updated'
-        ]
-        
         try:
-            range_name = f'{sheet_name}!A1:K1'
-            body = {'values': [headers]}
-            self.sheets.values().update(
+            range_name = self._a1(sheet_name, 'A1:K1')
+            body = {'values': [self.HEADERS]}
+            self._execute(self.sheets.values().update(
                 spreadsheetId=spreadsheet_id,
                 range=range_name,
                 valueInputOption='RAW',
                 body=body
-            ).execute()
+            ))
             
-            # Format headers
+            # Format and freeze headers
+            sheet_id = self.get_sheet_id(spreadsheet_id, sheet_name)
             requests = [{
                 'repeatCell': {
                     'range': {
-                        'sheetId': self.get_sheet_id(spreadsheet_id, sheet_name),
+                        'sheetId': sheet_id,
                         'startRowIndex': 0,
                         'endRowIndex': 1
                     },
                     'cell': {
-                        'userEnteredFormat': {
-                            'backgroundColor': {'red': 0.8, 'green': 0.8, 'blue': 0.8},
-                            'textFormat': {'bold': True}
-                        }
+                        'userEnteredFormat': self.HEADER_FORMAT
                     },
                     'fields': 'userEnteredFormat(backgroundColor,textFormat)'
                 }
+            }, {
+                'updateSheetProperties': {
+                    'properties': {
+                        'sheetId': sheet_id,
+                        'gridProperties': {'frozenRowCount': 1}
+                    },
+                    'fields': 'gridProperties.frozenRowCount'
+                }
             }]
             
             body = {'requests': requests}
-            self.sheets.batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+            self._execute(self.sheets.batchUpdate(spreadsheetId=spreadsheet_id, body=body))
+            self.metadata_cache[spreadsheet_id][sheet_name]['frozen_rows'] = 1
             
         except Exception as e:
+            # The sheet may have been renamed or deleted behind our back
+            self.invalidate_metadata(spreadsheet_id)
             logging.error(f"Error setting up headers: {str(e)}")
             raise
             
+    def get_sheet_metadata(self, spreadsheet_id, refresh=False):
+        """Get {title: {'sheet_id', 'frozen_rows'}} for a spreadsheet, cached per spreadsheet"""
+        if refresh or spreadsheet_id not in self.metadata_cache:
+            spreadsheet = self._execute(self.sheets.get(
+                spreadsheetId=spreadsheet_id,
+                fields=self.METADATA_FIELDS
+            ))
+            self.metadata_cache[spreadsheet_id] = {}
+            for sheet in spreadsheet.get('sheets', []):
+                self._cache_sheet(spreadsheet_id, sheet['properties'])
+        return self.metadata_cache[spreadsheet_id]
+
+    def invalidate_metadata(self, spreadsheet_id):
+        """Drop cached metadata so the next lookup refetches it"""
+        self.metadata_cache.pop(spreadsheet_id, None)
+
+    def _cache_sheet(self, spreadsheet_id, properties):
+        """Store one sheet's properties in the metadata cache"""
+        self.metadata_cache.setdefault(spreadsheet_id, {})[properties['title']] = {
+            'sheet_id': properties['sheetId'],
+            'frozen_rows': properties.get('gridProperties', {}).get('frozenRowCount', 0)
+        }
+
     def get_sheet_id(self, spreadsheet_id, sheet_name):
         """Get the sheet ID by name"""
         try:
-            spreadsheet = self.sheets.get(spreadsheetId=spreadsheet_id).execute()
-            for sheet in spreadsheet['sheets']:
-                if sheet['properties']['title'] == sheet_name:
-                    return sheet['properties']['sheetId']
-            return None
+            sheet = self.get_sheet_metadata(spreadsheet_id).get(sheet_name)
+            if sheet is None:
+                # The sheet may have been added since the cache was filled
+                sheet = self.get_sheet_metadata(spreadsheet_id, refresh=True).get(sheet_name)
+            return sheet['sheet_id'] if sheet else None
         except Exception as e:
             logging.error(f"Error getting sheet ID: {str(e)}")
             raise
             
-    def get_existing_listings(self, spreadsheet_id, sheet_name):
-        """Get existing listings from the sheet"""
+    def ensure_sheet(self, spreadsheet_id, sheet_name, retry=True):
+        """Make sure the sheet exists with headers and formatting, in at most one batchUpdate"""
+        metadata = self.get_sheet_metadata(spreadsheet_id)
+        sheet = metadata.get(sheet_name)
+        
+        # Already provisioned: nothing to send
+        if sheet and sheet['frozen_rows'] >= 1:
+            return sheet['sheet_id']
+        
+        requests = []
+        if sheet:
+            sheet_id = sheet['sheet_id']
+        else:
+            # Pick the ID ourselves so later requests in the same batch can refer to it
+            used_ids = {s['sheet_id'] for s in metadata.values()}
+            sheet_id = random.randint(1, 2 ** 31 - 1)
+            while sheet_id in used_ids:
+                sheet_id = random.randint(1, 2 ** 31 - 1)
+            requests.append({
+                'addSheet': {
+                    'properties': {'sheetId': sheet_id, 'title': sheet_name}
+                }
+            })
+        
+        requests.extend(self._provisioning_requests(sheet_id))
+        
         try:
-            result = self.sheets.values().get(
+            self._execute(self.sheets.batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                range=f'{sheet_name}!A:G'
-            ).execute()
-            
-            values = result.get('values', [])
-            if not values:
-                return set()
-                
-            # Skip header row and get URLs (column G)
-            return {row[6] for row in values[1:] if len(row) > 6}
-            
+                body={'requests': requests}
+            ))
+        except HttpError as e:
+            # Someone else created or renamed the sheet since we cached metadata
+            self.invalidate_metadata(spreadsheet_id)
+            if retry:
+                return self.ensure_sheet(spreadsheet_id, sheet_name, retry=False)
+            logging.error(f"Error provisioning sheet: {str(e)}")
+            raise
+        
+        self._cache_sheet(spreadsheet_id, {
+            'sheetId': sheet_id,
+            'title': sheet_name,
+            'gridProperties': {'frozenRowCount': 1}
+        })
+        logging.info(f"Provisioned sheet '{sheet_name}'")
+        return sheet_id
+
+    def _provisioning_requests(self, sheet_id):
+        """Requests that write, style and freeze the header row and format the sheet"""
+        return [
+            {
+                'updateCells': {
+                    'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+                    'rows': [{
+                        'values': [{
+                            'userEnteredValue': {'stringValue': header},
+                            'userEnteredFormat': self.HEADER_FORMAT
+                        } for header in self.HEADERS]
+                    }],
+                    'fields': 'userEnteredValue,userEnteredFormat(backgroundColor,textFormat)'
+                }
+            },
+            {
+                'updateSheetProperties': {
+                    'properties': {
+                        'sheetId': sheet_id,
+                        'gridProperties': {'frozenRowCount': 1}
+                    },
+                    'fields': 'gridProperties.frozenRowCount'
+                }
+            }
+        ] + self._format_requests(sheet_id)
+
+    def get_existing_listings(self, spreadsheet_id, sheet_name):
+        """Get existing listing URLs from the local index, synced with the sheet"""
+        try:
+            self.sync_url_index(spreadsheet_id, sheet_name)
+            return self.url_index.get_urls(spreadsheet_id, sheet_name)
         except Exception as e:
             logging.error(f"Error getting existing listings: {str(e)}")
             return set()
+
+    def sync_url_index(self, spreadsheet_id, sheet_name):
+        """Read only the rows added since the last sync into the local URL index"""
+        # Row 1 holds the headers
+        start_row = max(self.url_index.get_row_count(spreadsheet_id, sheet_name) + 1, 2)
+        result = self._execute(self.sheets.values().get(
+            spreadsheetId=spreadsheet_id,
+            range=self._a1(sheet_name, f'{self.URL_COLUMN}{start_row}:{self.URL_COLUMN}')
+        ))
+        
+        values = result.get('values', [])
+        if not values:
+            return
+        
+        rows = [(row[0], start_row + i) for i, row in enumerate(values) if row and row[0]]
+        self.url_index.add_rows(spreadsheet_id, sheet_name, rows, start_row + len(values) - 1)
+        logging.info(f"Indexed {len(rows)} rows from {sheet_name} starting at row {start_row}")
+
+    def rebuild_url_index(self, spreadsheet_id, sheet_name):
+        """Re-read the whole URL column, e.g. after rows were edited by hand"""
+        self.url_index.reset(spreadsheet_id, sheet_name)
+        self.sync_url_index(spreadsheet_id, sheet_name)
+
+    def _first_updated_row(self, update_response):
+        """Get the first row number from an append response's updatedRange"""
+        updated_range = update_response.get('updates', {}).get('updatedRange', '')
+        match = re.search(r'![A-Z]+(\d+)', updated_range)
+        return int(match.group(1)) if match else None
             
     def update_sheet(self, spreadsheet_id, listings, sheet_name='Listings'):
         """Update sheet with new listings"""
         try:
-            # Ensure sheet exists
-            try:
-                self.create_sheet(spreadsheet_id, sheet_name)
-                self.setup_headers(spreadsheet_id, sheet_name)
-            except:
-                pass
-                
-            # Get existing listings
-            existing_urls = self.get_existing_listings(spreadsheet_id, sheet_name)
+            if self.shard_router:
+                return self.shard_router.write(spreadsheet_id, listings, sheet_name, update_existing=False)
+            
+            # Ensure sheet exists (no API calls once it is provisioned)
+            self.ensure_sheet(spreadsheet_id, sheet_name)
             
-            # Filter out existing listings
-            new_listings = [l for l in listings if l['url'] not in existing_urls]
+            # Filter out listings already in the sheet, using the local URL index
+            self.sync_url_index(spreadsheet_id, sheet_name)
+            new_urls = set(self.url_index.filter_new(
+                spreadsheet_id, sheet_name, [l.get('url') for l in listings]
+            ))
+            new_listings = []
+            for listing in listings:
+                if listing.get('url') in new_urls:
+                    new_listings.append(listing)
+                    new_urls.discard(listing['url'])
             
             if not new_listings:
                 logging.info("No new listings to add")
-                return
+                return 0
                 
-            # Prepare data for Google Sheets
-            values = [[
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                listing.get('title', ''),
-                listing.get('price', ''),
-                listing.get('location', ''),
-                listing.get('size', ''),
-                listing.get('type', ''),
-                listing.get('url', ''),
-                listing.get('source_website', ''),
-                listing.get('description', ''),
-                listing.get('contact_info', ''),
-                listing.get('last_updated', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            ] for listing in new_listings]
-            
-            body = {
-                'values': values
-            }
-            
-            # Append new listings
-            self.sheets.values().append(
-                spreadsheetId=spreadsheet_id,
-                range=f'{sheet_name}!A:K',
-                valueInputOption='USER_ENTERED',
-                insertDataOption='INSERT_ROWS',
-                body=body
-            ).execute()
-            
-            logging.info(f"Added {len(new_listings)} new listings to sheet")
+            added = self._append_listings(spreadsheet_id, sheet_name, new_listings)
+            logging.info(f"Added {added} new listings to sheet")
+            return added
             
         except Exception as e:
             logging.error(f"Error updating sheet: {str(e)}")
             raise
+
+    def upsert_sheet(self, spreadsheet_id, listings, sheet_name='Listings', remove_urls=None):
+        """Append new listings, rewrite changed cells of existing ones and delete removed ones"""
+        try:
+            if self.shard_router:
+                return self.shard_router.write(spreadsheet_id, listings, sheet_name, remove_urls=remove_urls)
             
-    def format_sheet(self, spreadsheet_id, sheet_name):
-        """Apply formatting to the sheet"""
+            self.ensure_sheet(spreadsheet_id, sheet_name)
+            self.sync_url_index(spreadsheet_id, sheet_name)
+            return self._upsert_rows(spreadsheet_id, sheet_name, listings, remove_urls)
+            
+        except Exception as e:
+            logging.error(f"Error upserting sheet: {str(e)}")
+            raise
+
+    def _upsert_rows(self, spreadsheet_id, sheet_name, listings, remove_urls=None):
+        """Upsert into a provisioned sheet whose URL index is already synced"""
+        # Last occurrence of a URL wins
+        by_url = OrderedDict((l['url'], l) for l in listings if l.get('url'))
+        existing = self.url_index.get_rows(spreadsheet_id, sheet_name, by_url.keys())
+        
+        # Build one range per changed row, from its first changed cell to Last Updated
+        data = []
+        written_values = {}
+        for url, (row_number, old_values) in existing.items():
+            row = self._listing_row(by_url[url])
+            content = self._content_values(row)
+            first_changed = self._first_changed_column(old_values, content)
+            if first_changed is None:
+                continue
+            data.append({
+                'range': self._a1(sheet_name, f'{self._column_letter(first_changed)}{row_number}:K{row_number}'),
+                'values': [row[first_changed:]]
+            })
+            written_values[url] = content
+        
+        for chunk in chunk_rows(data):
+            self._execute(self.sheets.values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'valueInputOption': 'USER_ENTERED', 'data': chunk}
+            ))
+        if written_values:
+            self.url_index.set_row_values(spreadsheet_id, sheet_name, written_values)
+        
+        new_listings = [l for url, l in by_url.items() if url not in existing]
+        added = self._append_listings(spreadsheet_id, sheet_name, new_listings) if new_listings else 0
+        deleted = self.delete_listings(spreadsheet_id, remove_urls, sheet_name) if remove_urls else 0
+        
+        logging.info(f"Upserted {sheet_name}: {added} added, {len(data)} updated, {deleted} deleted")
+        return added + len(data)
+
+    def create_spreadsheet(self, title):
+        """Create a spreadsheet and return its ID
+
+        Spreadsheets created by a service account live in its own Drive; share them
+        with the people who need to read them.
+        """
+        try:
+            spreadsheet = self._execute(self.sheets.create(
+                body={'properties': {'title': title}},
+                fields='spreadsheetId'
+            ))
+            logging.info(f"Created spreadsheet '{title}' ({spreadsheet['spreadsheetId']})")
+            return spreadsheet['spreadsheetId']
+        except Exception as e:
+            logging.error(f"Error creating spreadsheet: {str(e)}")
+            raise
+
+    def read_table(self, spreadsheet_id, sheet_name):
+        """Read all values of a small sheet, or [] if it does not exist"""
+        if self.get_sheet_id(spreadsheet_id, sheet_name) is None:
+            return []
+        result = self._execute(self.sheets.values().get(
+            spreadsheetId=spreadsheet_id,
+            range=self._a1(sheet_name)
+        ))
+        return result.get('values', [])
+
+    def write_table(self, spreadsheet_id, sheet_name, rows):
+        """Overwrite a small sheet from A1, creating it first if needed"""
+        if self.get_sheet_id(spreadsheet_id, sheet_name) is None:
+            response = self._execute(self.sheets.batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'requests': [{'addSheet': {'properties': {'title': sheet_name}}}]}
+            ))
+            self._cache_sheet(spreadsheet_id, response['replies'][0]['addSheet']['properties'])
+        self._execute(self.sheets.values().update(
+            spreadsheetId=spreadsheet_id,
+            range=self._a1(sheet_name, 'A1'),
+            valueInputOption='RAW',
+            body={'values': rows}
+        ))
+
+    def delete_listings(self, spreadsheet_id, urls, sheet_name='Listings'):
+        """Delete the rows of the given listings with one batchUpdate"""
         try:
+            rows = self.url_index.get_rows(spreadsheet_id, sheet_name, urls)
+            row_numbers = sorted((row_number for row_number, _ in rows.values()), reverse=True)
+            if not row_numbers:
+                return 0
+            
             sheet_id = self.get_sheet_id(spreadsheet_id, sheet_name)
-            requests = [
-                # Auto-resize columns
-                {
-                    'autoResizeDimensions': {
-                        'dimensions': {
-                            'sheetId': sheet_id,
-                            'dimension': 'COLUMNS',
-                            'startIndex': 0,
-                            'endIndex': 11
-                        }
-                    }
-                },
-                # Format price column
-                {
-                    'repeatCell': {
+            
+            # Merge adjacent rows and delete bottom-up so earlier deletes do not shift later ones
+            requests = []
+            for start, end in self._row_runs(row_numbers):
+                requests.append({
+                    'deleteDimension': {
                         'range': {
                             'sheetId': sheet_id,
-                            'startColumnIndex': 2,
-                            'endColumnIndex': 3
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'numberFormat': {
-                                    'type': 'CURRENCY',
-                                    'pattern': '"$"#,##0.00'
-                                }
-                            }
-                        },
-                        'fields': 'userEnteredFormat.numberFormat'
+                            'dimension': 'ROWS',
+                            'startIndex': start - 1,
+                            'endIndex': end
+                        }
                     }
-                }
-            ]
+                })
             
-            body = {'requests': requests}
-            self.sheets.batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+            self._execute(self.sheets.batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'requests': requests}
+            ))
+            self.url_index.delete_rows(spreadsheet_id, sheet_name, row_numbers)
+            
+            logging.info(f"Deleted {len(row_numbers)} rows from {sheet_name}")
+            return len(row_numbers)
+            
+        except Exception as e:
+            self.invalidate_metadata(spreadsheet_id)
+            logging.error(f"Error deleting listings: {str(e)}")
+            raise
+
+    def _append_listings(self, spreadsheet_id, sheet_name, new_listings):
+        """Append listings in payload-sized chunks and record them in the URL index"""
+        values = [self._listing_row(listing) for listing in new_listings]
+        
+        # Record each chunk once it lands so a failure part-way through
+        # does not duplicate rows on the next run
+        added = 0
+        for chunk in chunk_rows(values):
+            chunk_listings = new_listings[added:added + len(chunk)]
+            added += len(chunk)
+            response, chunk_listings, chunk = self._append_chunk(
+                spreadsheet_id, sheet_name, chunk_listings, chunk
+            )
+            
+            # Record the appended rows so the next sync starts below them
+            first_row = self._first_updated_row(response) if response else None
+            if first_row:
+                rows = [(l['url'], first_row + i) for i, l in enumerate(chunk_listings)]
+                self.url_index.add_rows(spreadsheet_id, sheet_name, rows, first_row + len(rows) - 1)
+                self.url_index.set_row_values(spreadsheet_id, sheet_name, {
+                    l['url']: self._content_values(row) for l, row in zip(chunk_listings, chunk)
+                })
+        return added
+
+    def _append_chunk(self, spreadsheet_id, sheet_name, chunk_listings, chunk):
+        """Append one chunk; returns (response, listings, rows) actually sent last
+        
+        A 5xx may arrive after the rows were written, so instead of resending
+        the same request the URL index is re-synced and only rows that did not
+        land are appended again. response is None if they all landed.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._execute_append(spreadsheet_id, sheet_name, chunk), chunk_listings, chunk
+            except HttpError as e:
+                status = getattr(e.resp, 'status', None)
+                if status not in RETRYABLE_STATUSES or attempt >= self.MAX_APPEND_RETRIES:
+                    raise
+                attempt += 1
+                delay = backoff_delay(attempt)
+                logging.warning(
+                    f"Append to {sheet_name} failed with {status}, re-checking rows before retry "
+                    f"{attempt}/{self.MAX_APPEND_RETRIES} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+            
+            self.sync_url_index(spreadsheet_id, sheet_name)
+            missing = set(self.url_index.filter_new(
+                spreadsheet_id, sheet_name, [l['url'] for l in chunk_listings]
+            ))
+            kept = [(l, row) for l, row in zip(chunk_listings, chunk) if l['url'] in missing]
+            if not kept:
+                logging.info(f"Rows for {sheet_name} had landed before the error, not resending")
+                return None, [], []
+            chunk_listings = [l for l, _ in kept]
+            chunk = [row for _, row in kept]
+
+    def _execute_append(self, spreadsheet_id, sheet_name, rows):
+        """Send one append, retrying only rate-limit rejections, which never write rows"""
+        return execute_with_retry(self.sheets.values().append(
+            spreadsheetId=spreadsheet_id,
+            range=self._a1(sheet_name, 'A:K'),
+            valueInputOption='USER_ENTERED',
+            insertDataOption='INSERT_ROWS',
+            body={'values': rows}
+        ), self.rate_limiter, retry_statuses=REJECTED_STATUSES)
+
+    def _content_values(self, row):
+        """Listing columns B:J, i.e. the row without its timestamps"""
+        return json.loads(json.dumps(row[1:10], ensure_ascii=False, default=str))
+
+    def _first_changed_column(self, old_values, new_values):
+        """Index (in A:K) of the first content cell that differs, or None if unchanged"""
+        if old_values is None:
+            return 1
+        for i, (old, new) in enumerate(zip(old_values, new_values)):
+            if old != new:
+                return i + 1
+        return None
+
+    def _a1(self, sheet_name, cells=None):
+        """A1 range for a sheet, quoting the name so spaces and symbols are safe"""
+        quoted = "'" + sheet_name.replace("'", "''") + "'"
+        return f'{quoted}!{cells}' if cells else quoted
+
+    def _column_letter(self, index):
+        """Column letter for a 0-based index within A:Z"""
+        return chr(ord('A') + index)
+
+    def _row_runs(self, row_numbers):
+        """Group descending row numbers into (first, last) runs of adjacent rows"""
+        runs = []
+        for row_number in row_numbers:
+            if runs and runs[-1][0] == row_number + 1:
+                runs[-1] = (row_number, runs[-1][1])
+            else:
+                runs.append((row_number, row_number))
+        return runs
+
+    def _listing_row(self, listing):
+        """Convert a listing to a sheet row (columns A:K)"""
+        return [
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            listing.get('title', ''),
+            listing.get('price', ''),
+            listing.get('location', ''),
+            listing.get('size', ''),
+            listing.get('type', ''),
+            listing.get('url', ''),
+            listing.get('source_website', ''),
+            listing.get('description', ''),
+            listing.get('contact_info', ''),
+            listing.get('last_updated', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        ]
+            
+    def format_sheet(self, spreadsheet_id, sheet_name):
+        """Apply formatting to the sheet"""
+        try:
+            sheet_id = self.get_sheet_id(spreadsheet_id, sheet_name)
+            body = {'requests': self._format_requests(sheet_id)}
+            self._execute(self.sheets.batchUpdate(spreadsheetId=spreadsheet_id, body=body))
             
         except Exception as e:
+            self.invalidate_metadata(spreadsheet_id)
             logging.error(f"Error formatting sheet: {str(e)}")
             raise
+
+    def _format_requests(self, sheet_id):
+        """Column sizing and price format requests for a sheet"""
+        return [
+            # Auto-resize columns
+            {
+                'autoResizeDimensions': {
+                    'dimensions': {
+                        'sheetId': sheet_id,
+                        'dimension': 'COLUMNS',
+                        'startIndex': 0,
+                        'endIndex': 11
+                    }
+                }
+            },
+            # Format price column
+            {
+                'repeatCell': {
+                    'range': {
+                        'sheetId': sheet_id,
+                        'startColumnIndex': 2,
+                        'endColumnIndex': 3
+                    },
+                    'cell': {
+                        'userEnteredFormat': {
+                            'numberFormat': {
+                                'type': 'CURRENCY',
+                                'pattern': '"$"#,##0.00'
+                            }
+                        }
+                    },
+                    'fields': 'userEnteredFormat.numberFormat'
+                }
+            }
+        ]
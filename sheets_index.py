@@ -0,0 +1,215 @@
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class SheetUrlIndex:
+    """Local persistent index of listing URLs already written to each sheet
+
+    Keyed by (spreadsheet, sheet). Along with the URLs it remembers how many rows of
+    the sheet have been read, so a sync only needs to fetch rows below that point.
+    """
+
+    # Keep IN (...) lists under SQLite's bound parameter limit
+    BATCH_SIZE = 500
+
+    def __init__(self, db_path='sheets_index.db'):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self.ensure_schema()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def ensure_schema(self):
+        """Create tables if they do not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sheet_rows (
+                    spreadsheet_id TEXT NOT NULL,
+                    sheet_name TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    row_number INTEGER NOT NULL,
+                    row_values TEXT,
+                    PRIMARY KEY (spreadsheet_id, sheet_name, url)
+                );
+                CREATE TABLE IF NOT EXISTS sheet_state (
+                    spreadsheet_id TEXT NOT NULL,
+                    sheet_name TEXT NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    synced_at TEXT NOT NULL,
+                    PRIMARY KEY (spreadsheet_id, sheet_name)
+                );
+                CREATE INDEX IF NOT EXISTS idx_sheet_rows_row_number
+                    ON sheet_rows (spreadsheet_id, sheet_name, row_number);
+                CREATE INDEX IF NOT EXISTS idx_sheet_rows_url ON sheet_rows (url);
+                CREATE TABLE IF NOT EXISTS sheet_shards (
+                    spreadsheet_id TEXT NOT NULL,
+                    base_name TEXT NOT NULL,
+                    shard_spreadsheet_id TEXT NOT NULL,
+                    shard_name TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    sequence INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (spreadsheet_id, base_name, shard_spreadsheet_id, shard_name)
+                );
+            """)
+            
+            # Indexes created before upsert support lack the row_values column
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(sheet_rows)')}
+            if 'row_values' not in columns:
+                conn.execute('ALTER TABLE sheet_rows ADD COLUMN row_values TEXT')
+
+    def get_row_count(self, spreadsheet_id, sheet_name) -> int:
+        """Get the last sheet row known to the index (0 if never synced)"""
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                'SELECT row_count FROM sheet_state WHERE spreadsheet_id = ? AND sheet_name = ?',
+                (spreadsheet_id, sheet_name)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_urls(self, spreadsheet_id, sheet_name) -> Set[str]:
+        """Get every indexed URL of a sheet"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT url FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ?',
+                (spreadsheet_id, sheet_name)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def filter_new(self, spreadsheet_id, sheet_name, urls: Iterable[str]) -> List[str]:
+        """Return the URLs not yet in the sheet, in order and without duplicates"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        known = set()
+        with closing(self.connect()) as conn:
+            for i in range(0, len(urls), self.BATCH_SIZE):
+                batch = urls[i:i + self.BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT url FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ? '
+                    f'AND url IN ({placeholders})',
+                    [spreadsheet_id, sheet_name] + batch
+                ).fetchall()
+                known.update(row[0] for row in rows)
+        return [u for u in urls if u not in known]
+
+    def add_rows(self, spreadsheet_id, sheet_name, rows: List[Tuple[str, int]], row_count: int):
+        """Record (url, row_number) pairs and advance the known row count"""
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO sheet_rows (spreadsheet_id, sheet_name, url, row_number) '
+                'VALUES (?, ?, ?, ?)',
+                [(spreadsheet_id, sheet_name, url, row_number) for url, row_number in rows]
+            )
+            conn.execute(
+                'INSERT INTO sheet_state (spreadsheet_id, sheet_name, row_count, synced_at) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT(spreadsheet_id, sheet_name) DO UPDATE SET '
+                'row_count = MAX(row_count, excluded.row_count), synced_at = excluded.synced_at',
+                (spreadsheet_id, sheet_name, row_count, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def get_rows(self, spreadsheet_id, sheet_name, urls: Iterable[str]) -> Dict[str, Tuple[int, Optional[list]]]:
+        """Map URLs present in the sheet to (row_number, last written row values or None)"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        rows = {}
+        with closing(self.connect()) as conn:
+            for i in range(0, len(urls), self.BATCH_SIZE):
+                batch = urls[i:i + self.BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                for url, row_number, row_values in conn.execute(
+                    f'SELECT url, row_number, row_values FROM sheet_rows '
+                    f'WHERE spreadsheet_id = ? AND sheet_name = ? AND url IN ({placeholders})',
+                    [spreadsheet_id, sheet_name] + batch
+                ):
+                    rows[url] = (row_number, json.loads(row_values) if row_values else None)
+        return rows
+
+    def set_row_values(self, spreadsheet_id, sheet_name, values_by_url: Dict[str, list]):
+        """Remember the values last written for each URL's row"""
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                'UPDATE sheet_rows SET row_values = ? '
+                'WHERE spreadsheet_id = ? AND sheet_name = ? AND url = ?',
+                [
+                    (json.dumps(values, ensure_ascii=False, default=str), spreadsheet_id, sheet_name, url)
+                    for url, values in values_by_url.items()
+                ]
+            )
+
+    def delete_rows(self, spreadsheet_id, sheet_name, row_numbers: List[int]):
+        """Drop deleted rows and shift the row numbers below them up"""
+        with closing(self.connect()) as conn, conn:
+            # Highest first, so earlier shifts do not move rows still to be deleted
+            for row_number in sorted(set(row_numbers), reverse=True):
+                conn.execute(
+                    'DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ? AND row_number = ?',
+                    (spreadsheet_id, sheet_name, row_number)
+                )
+                conn.execute(
+                    'UPDATE sheet_rows SET row_number = row_number - 1 '
+                    'WHERE spreadsheet_id = ? AND sheet_name = ? AND row_number > ?',
+                    (spreadsheet_id, sheet_name, row_number)
+                )
+            conn.execute(
+                'UPDATE sheet_state SET row_count = MAX(row_count - ?, 1) '
+                'WHERE spreadsheet_id = ? AND sheet_name = ?',
+                (len(set(row_numbers)), spreadsheet_id, sheet_name)
+            )
+
+    def locate(self, urls: Iterable[str], sheets: Iterable[Tuple[str, str]]) -> Dict[str, Tuple[str, str]]:
+        """Map URLs to the (spreadsheet_id, sheet_name) among `sheets` that holds them"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        sheets = set(sheets)
+        found = {}
+        with closing(self.connect()) as conn:
+            for i in range(0, len(urls), self.BATCH_SIZE):
+                batch = urls[i:i + self.BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                for url, spreadsheet_id, sheet_name in conn.execute(
+                    f'SELECT url, spreadsheet_id, sheet_name FROM sheet_rows WHERE url IN ({placeholders})',
+                    batch
+                ):
+                    if (spreadsheet_id, sheet_name) in sheets:
+                        found.setdefault(url, (spreadsheet_id, sheet_name))
+        return found
+
+    def get_shards(self, spreadsheet_id, base_name) -> List[Dict]:
+        """Get the shards of a sheet, oldest first"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT shard_spreadsheet_id, shard_name, period, sequence, created_at FROM sheet_shards '
+                'WHERE spreadsheet_id = ? AND base_name = ? ORDER BY rowid',
+                (spreadsheet_id, base_name)
+            ).fetchall()
+        return [
+            {'spreadsheet_id': shard_spreadsheet_id, 'sheet_name': shard_name,
+             'period': period, 'sequence': sequence, 'created_at': created_at}
+            for shard_spreadsheet_id, shard_name, period, sequence, created_at in rows
+        ]
+
+    def add_shard(self, spreadsheet_id, base_name, shard: Dict):
+        """Record a new shard of a sheet"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO sheet_shards (spreadsheet_id, base_name, shard_spreadsheet_id, '
+                'shard_name, period, sequence, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (spreadsheet_id, base_name, shard['spreadsheet_id'], shard['sheet_name'],
+                 shard['period'], shard['sequence'], shard['created_at'])
+            )
+
+    def reset(self, spreadsheet_id, sheet_name):
+        """Forget everything known about a sheet so the next sync reads it in full"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ?',
+                (spreadsheet_id, sheet_name)
+            )
+            conn.execute(
+                'DELETE FROM sheet_state WHERE spreadsheet_id = ? AND sheet_name = ?',
+                (spreadsheet_id, sheet_name)
+            )
+        self.logger.info(f"Reset URL index for {spreadsheet_id}/{sheet_name}")
@@ -0,0 +1,134 @@
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+
+class SheetsOutbox:
+    """Durable queue of listings waiting to be written to Google Sheets
+
+    Producers (the processor, or anything reading the DB) enqueue rows; the sync
+    worker drains them on its own schedule. Rows are only deleted once the sheet
+    write succeeds, so a Sheets outage delays rows instead of losing them.
+    """
+
+    # Failed rows wait BASE_BACKOFF * 2^(attempts - 1) seconds, capped at
+    # MAX_BACKOFF, before their next try; they are never dropped
+    BASE_BACKOFF = 60
+    MAX_BACKOFF = 3600
+    # Failures after this many attempts are logged as warnings
+    WARN_ATTEMPTS = 10
+
+    def __init__(self, db_path='sheets_outbox.db'):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self.ensure_schema()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def ensure_schema(self):
+        """Create the outbox table if it does not exist"""
+        with closing(self.connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sheets_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sheet_name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    next_attempt_at TEXT
+                )
+            """)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(sheets_outbox)')}
+            if 'next_attempt_at' not in columns:
+                # Outboxes created before backoff existed
+                conn.execute('ALTER TABLE sheets_outbox ADD COLUMN next_attempt_at TEXT')
+
+    def enqueue(self, listings: List[Dict[str, Any]], sheet_name='Listings') -> int:
+        """Add listings to the outbox"""
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = [
+            (sheet_name, json.dumps(listing, ensure_ascii=False, default=str), now)
+            for listing in listings
+        ]
+        if not rows:
+            return 0
+
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                'INSERT INTO sheets_outbox (sheet_name, payload, created_at) VALUES (?, ?, ?)',
+                rows
+            )
+        return len(rows)
+
+    def fetch_pending(self, limit=1000) -> List[Dict[str, Any]]:
+        """Get the oldest entries due for a try as {'id', 'sheet_name', 'listing'} dicts"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT id, sheet_name, payload FROM sheets_outbox '
+                'WHERE next_attempt_at IS NULL OR next_attempt_at <= ? '
+                'ORDER BY id LIMIT ?',
+                (self._now(), limit)
+            ).fetchall()
+        return [
+            {'id': row_id, 'sheet_name': sheet_name, 'listing': json.loads(payload)}
+            for row_id, sheet_name, payload in rows
+        ]
+
+    def mark_sent(self, ids: List[int]):
+        """Remove entries that were written to the sheet"""
+        with closing(self.connect()) as conn, conn:
+            conn.executemany('DELETE FROM sheets_outbox WHERE id = ?', [(i,) for i in ids])
+
+    def mark_failed(self, ids: List[int], error: str):
+        """Record a failed attempt and schedule the entries' next try with exponential backoff"""
+        if not ids:
+            return
+        now = datetime.now()
+        with closing(self.connect()) as conn, conn:
+            placeholders = ','.join('?' * len(ids))
+            rows = conn.execute(
+                f'SELECT id, attempts + 1 FROM sheets_outbox WHERE id IN ({placeholders})', ids
+            ).fetchall()
+            updates = []
+            for row_id, attempts in rows:
+                delay = min(self.BASE_BACKOFF * 2 ** (attempts - 1), self.MAX_BACKOFF)
+                next_attempt = (now + timedelta(seconds=delay)).isoformat(timespec='seconds')
+                updates.append((attempts, error[:500], next_attempt, row_id))
+            conn.executemany(
+                'UPDATE sheets_outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?',
+                updates
+            )
+
+        most = max((attempts for attempts, *_ in updates), default=0)
+        message = f"{len(ids)} outbox entries failed (up to {most} attempts), backing off: {error[:200]}"
+        if most >= self.WARN_ATTEMPTS:
+            self.logger.warning(message)
+        else:
+            self.logger.info(message)
+
+    def retry_now(self) -> int:
+        """Make every backed-off entry due immediately, e.g. after fixing credentials"""
+        with closing(self.connect()) as conn, conn:
+            return conn.execute(
+                'UPDATE sheets_outbox SET next_attempt_at = NULL WHERE next_attempt_at IS NOT NULL'
+            ).rowcount
+
+    def pending_count(self) -> int:
+        with closing(self.connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM sheets_outbox').fetchone()[0]
+
+    def failing_count(self) -> int:
+        """Entries that have failed at least WARN_ATTEMPTS times"""
+        with closing(self.connect()) as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM sheets_outbox WHERE attempts >= ?', (self.WARN_ATTEMPTS,)
+            ).fetchone()[0]
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec='seconds')
@@ -0,0 +1,184 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Sheet in the main spreadsheet listing every shard
+INDEX_SHEET = 'Shard Index'
+INDEX_HEADERS = ['Base Sheet', 'Shard', 'Spreadsheet ID', 'Period', 'Sequence', 'Created', 'Rows At Rotation']
+
+
+class ShardPolicy:
+    """When listings move on to a new shard
+
+    period='month' starts a new sheet every calendar month, max_rows starts one
+    whenever the current shard holds that many listings, and
+    max_sheets_per_spreadsheet moves new shards into a freshly created spreadsheet
+    once the current one holds that many shards.
+    """
+
+    def __init__(self, period: Optional[str] = 'month', max_rows: Optional[int] = None,
+                 max_sheets_per_spreadsheet: Optional[int] = None):
+        if period not in (None, 'month'):
+            raise ValueError(f"Unsupported shard period: {period}")
+        if period is None and not max_rows:
+            raise ValueError("A shard policy needs a period, max_rows or both")
+        self.period = period
+        self.max_rows = max_rows
+        self.max_sheets_per_spreadsheet = max_sheets_per_spreadsheet
+
+    def period_key(self, when=None) -> str:
+        """Period a write at `when` belongs to ('' when rotating by rows only)"""
+        if self.period == 'month':
+            return (when or datetime.now()).strftime('%Y-%m')
+        return ''
+
+    def shard_name(self, base_name, period, sequence) -> str:
+        """Sheet title of a shard, e.g. 'Listings 2024-05' or 'Listings 2024-05 #2'"""
+        parts = [base_name]
+        if period:
+            parts.append(period)
+        if sequence > 1 or not period:
+            parts.append(f'#{sequence}')
+        return ' '.join(parts)
+
+
+class SheetShardRouter:
+    """Routes Sheets writes for a base sheet name to time/size-bounded shards
+
+    New listings go to the active shard. Listings already in a sheet are found
+    through the local URL index and updated in the shard that holds them. Every
+    shard's index is caught up once per process, in case rows were added by
+    another process or by hand; after that only the active shard is read back
+    from the API, so per-write cost stays bounded by the shard size rather than
+    the total listing count. Listings written to the unsharded base sheet
+    before sharding was enabled are treated as one more closed shard.
+    """
+
+    def __init__(self, handler, policy: ShardPolicy):
+        self.handler = handler
+        self.policy = policy
+        self.url_index = handler.url_index
+        # Sheets whose index was caught up with the sheet by this process
+        self.synced = set()
+
+    def shard_rows(self, shard) -> int:
+        """Listings in a shard, from the local index (row 1 holds the headers)"""
+        return max(self.url_index.get_row_count(shard['spreadsheet_id'], shard['sheet_name']) - 1, 0)
+
+    def active_shard(self, spreadsheet_id, base_name) -> Dict:
+        """Get the shard new listings go to, rotating if its period ended or it is full"""
+        shards = self.url_index.get_shards(spreadsheet_id, base_name)
+        current = shards[-1] if shards else None
+        period = self.policy.period_key()
+
+        if current and current['period'] == period:
+            if not self.policy.max_rows or self.shard_rows(current) < self.policy.max_rows:
+                return current
+        return self.rotate(spreadsheet_id, base_name, shards, period)
+
+    def rotate(self, spreadsheet_id, base_name, shards, period) -> Dict:
+        """Start a new shard and record it in the local index and the index sheet"""
+        current = shards[-1] if shards else None
+        sequence = current['sequence'] + 1 if current and current['period'] == period else 1
+
+        # Stay in the current spreadsheet unless it already holds its share of shards
+        target = current['spreadsheet_id'] if current else spreadsheet_id
+        limit = self.policy.max_sheets_per_spreadsheet
+        if limit and sum(1 for s in shards if s['spreadsheet_id'] == target) >= limit:
+            title = f"{base_name} {period or datetime.now().strftime('%Y-%m-%d')}"
+            target = self.handler.create_spreadsheet(title)
+
+        shard = {
+            'spreadsheet_id': target,
+            'sheet_name': self.policy.shard_name(base_name, period, sequence),
+            'period': period,
+            'sequence': sequence,
+            'created_at': datetime.now().isoformat(timespec='seconds')
+        }
+        self.handler.ensure_sheet(shard['spreadsheet_id'], shard['sheet_name'])
+        self.url_index.add_shard(spreadsheet_id, base_name, shard)
+        self.write_index_sheet(spreadsheet_id, base_name, shards + [shard])
+
+        logging.info(f"Rotated {base_name} to shard '{shard['sheet_name']}' in {shard['spreadsheet_id']}")
+        return shard
+
+    def write_index_sheet(self, spreadsheet_id, base_name, shards):
+        """Rewrite this base sheet's block of the index sheet in the main spreadsheet"""
+        others = [
+            row for row in self.handler.read_table(spreadsheet_id, INDEX_SHEET)[1:]
+            if row and row[0] != base_name
+        ]
+        rows = others + [
+            [base_name, s['sheet_name'], s['spreadsheet_id'], s['period'], s['sequence'],
+             s['created_at'], self.shard_rows(s)]
+            for s in shards
+        ]
+        self.handler.write_table(spreadsheet_id, INDEX_SHEET, [INDEX_HEADERS] + rows)
+
+    def candidate_sheets(self, spreadsheet_id, base_name):
+        """Every sheet that may hold listings for base_name: the legacy sheet, then shards"""
+        sheets = [(spreadsheet_id, base_name)]
+        sheets.extend((s['spreadsheet_id'], s['sheet_name'])
+                      for s in self.url_index.get_shards(spreadsheet_id, base_name))
+        return sheets
+
+    def sync_sheets(self, sheets, active_key):
+        """Catch up the active shard's index, and every other sheet's once per process"""
+        for key in sheets:
+            if key in self.synced and key != active_key:
+                continue
+            # The legacy base sheet only exists if listings were written before sharding
+            if key[1] not in self.handler.get_sheet_metadata(key[0]):
+                self.synced.add(key)
+                continue
+            self.handler.sync_url_index(*key)
+            self.synced.add(key)
+
+    def write(self, spreadsheet_id, listings, base_name, update_existing=True, remove_urls=None) -> int:
+        """Append new listings to the active shard and, optionally, update existing ones in place"""
+        active = self.active_shard(spreadsheet_id, base_name)
+        active_key = (active['spreadsheet_id'], active['sheet_name'])
+
+        sheets = self.candidate_sheets(spreadsheet_id, base_name)
+        self.sync_sheets(sheets, active_key)
+
+        by_url = OrderedDict((l['url'], l) for l in listings if l.get('url'))
+        located = self.url_index.locate(list(by_url) + list(remove_urls or []), sheets)
+
+        written = 0
+        if update_existing:
+            groups = OrderedDict()
+            for url, listing in by_url.items():
+                if url in located:
+                    groups.setdefault(located[url], []).append(listing)
+            for (shard_spreadsheet_id, shard_name), shard_listings in groups.items():
+                written += self.handler._upsert_rows(shard_spreadsheet_id, shard_name, shard_listings)
+
+        new_listings = [l for url, l in by_url.items() if url not in located]
+        written += self.append(spreadsheet_id, base_name, active, new_listings)
+
+        if remove_urls:
+            removals = OrderedDict()
+            for url in remove_urls:
+                if url in located:
+                    removals.setdefault(located[url], []).append(url)
+            for (shard_spreadsheet_id, shard_name), urls in removals.items():
+                self.handler.delete_listings(shard_spreadsheet_id, urls, shard_name)
+
+        return written
+
+    def append(self, spreadsheet_id, base_name, active, new_listings: List[Dict]) -> int:
+        """Append to the active shard, rotating whenever it fills up"""
+        added = 0
+        while added < len(new_listings):
+            if self.policy.max_rows:
+                room = self.policy.max_rows - self.shard_rows(active)
+                if room <= 0:
+                    active = self.active_shard(spreadsheet_id, base_name)
+                    continue
+            else:
+                room = len(new_listings)
+            batch = new_listings[added:added + room]
+            added += self.handler._append_listings(active['spreadsheet_id'], active['sheet_name'], batch)
+        return added
@@ -0,0 +1,137 @@
+import logging
+import os
+import signal
+import sys
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sheets_handler import GoogleSheetsHandler
+from sheets_outbox import SheetsOutbox
+from sheets_shards import ShardPolicy
+
+class SheetsSyncWorker:
+    """Background worker that drains the Sheets outbox in batches"""
+
+    def __init__(self, spreadsheet_id, credentials_path,
+                 outbox_path=os.path.join('data', 'sheets_outbox.db'), interval=60, batch_size=1000,
+                 shard_policy=None):
+        self.setup_logging()
+        self.spreadsheet_id = spreadsheet_id
+        self.credentials_path = credentials_path
+        self.outbox = SheetsOutbox(outbox_path)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.shard_policy = shard_policy
+        self.handler = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def setup_logging(self):
+        """Setup logging configuration"""
+        logging.basicConfig(
+            filename='sheets_sync.log',
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+        self.logger = logging.getLogger(__name__)
+
+    def get_handler(self):
+        """Create the Sheets client lazily so an outage at startup is retried"""
+        if self.handler is None:
+            self.handler = GoogleSheetsHandler(self.credentials_path, shard_policy=self.shard_policy)
+        return self.handler
+
+    def run_once(self):
+        """Push one batch of pending rows; returns the number of outbox entries handled"""
+        entries = self.outbox.fetch_pending(self.batch_size)
+        if not entries:
+            return 0
+
+        by_sheet = OrderedDict()
+        for entry in entries:
+            by_sheet.setdefault(entry['sheet_name'], []).append(entry)
+
+        handled = 0
+        for sheet_name, sheet_entries in by_sheet.items():
+            ids = [e['id'] for e in sheet_entries]
+            try:
+                # Changed listings are rewritten in place; unchanged rows are skipped,
+                # so retrying a batch is safe
+                written = self.get_handler().upsert_sheet(
+                    self.spreadsheet_id,
+                    [e['listing'] for e in sheet_entries],
+                    sheet_name
+                )
+                self.outbox.mark_sent(ids)
+                handled += len(ids)
+                self.logger.info(f"Synced {len(ids)} outbox entries to {sheet_name} ({written} rows written)")
+            except Exception as e:
+                self.outbox.mark_failed(ids, str(e))
+                self.logger.error(f"Error syncing {len(ids)} entries to {sheet_name}: {str(e)}")
+        return handled
+
+    def run(self):
+        """Drain the outbox until stopped, sleeping between empty or failed cycles"""
+        self.logger.info("Sheets sync worker started")
+        while not self.stop_event.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                self.logger.error(f"Error in sheets sync cycle: {str(e)}")
+                handled = 0
+
+            # Keep going straight away while a full batch went through
+            if handled < self.batch_size:
+                self.stop_event.wait(self.interval)
+        self.logger.info("Sheets sync worker stopped")
+
+    def start(self):
+        """Run the worker on a daemon thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='sheets-sync', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Ask the worker to stop and wait for the current cycle to finish"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+def shard_policy_from_env():
+    """Build a ShardPolicy from SHEETS_SHARD_* settings, or None to write one sheet"""
+    period = os.getenv('SHEETS_SHARD_PERIOD', '').strip().lower() or None
+    max_rows = int(os.getenv('SHEETS_SHARD_MAX_ROWS', 0)) or None
+    max_sheets = int(os.getenv('SHEETS_SHARD_MAX_SHEETS', 0)) or None
+    if period in (None, 'none') and not max_rows:
+        return None
+    return ShardPolicy(
+        period=None if period == 'none' else period,
+        max_rows=max_rows,
+        max_sheets_per_spreadsheet=max_sheets
+    )
+
+def main():
+    load_dotenv()
+    worker = SheetsSyncWorker(
+        os.getenv('SPREADSHEET_ID'),
+        os.getenv('GOOGLE_SHEETS_CREDENTIALS', 'credentials.json'),
+        interval=int(os.getenv('SHEETS_SYNC_INTERVAL', 60)),
+        shard_policy=shard_policy_from_env()
+    )
+
+    # After fixing an outage's cause, skip the remaining backoff of failed rows
+    if '--retry-now' in sys.argv:
+        worker.logger.info(f"Requeued {worker.outbox.retry_now()} backed-off outbox entries")
+
+    def handle_shutdown(signum, frame):
+        worker.stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    worker.run()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
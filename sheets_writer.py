@@ -0,0 +1,129 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from googleapiclient.errors import HttpError
+
+# Statuses worth retrying: quota exhaustion and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# A 429 is rejected before any write, so it is the only status safe to resend
+# blindly for non-idempotent requests such as values().append
+REJECTED_STATUSES = {429}
+
+# Sheets allows 60 requests per minute per user by default
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+# Keep append payloads well below the API's request size limit
+MAX_ROWS_PER_CHUNK = 500
+MAX_BYTES_PER_CHUNK = 2_000_000
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to stay under the Sheets request quota"""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=10):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=64.0):
+    """Full-jitter exponential backoff for the given retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def execute_with_retry(request, rate_limiter=None, max_retries=5, base_delay=1.0, max_delay=64.0,
+                       retry_statuses=RETRYABLE_STATUSES):
+    """Execute an API request, retrying retry_statuses (429/5xx) with jittered exponential backoff"""
+    attempt = 0
+    while True:
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            return request.execute()
+        except HttpError as e:
+            status = getattr(e.resp, 'status', None)
+            if status not in retry_statuses or attempt >= max_retries:
+                raise
+
+            # Full jitter, but never retry sooner than the server asked us to
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            retry_after = e.resp.get('retry-after') if hasattr(e.resp, 'get') else None
+            if retry_after and str(retry_after).isdigit():
+                delay = max(delay, float(retry_after))
+
+            attempt += 1
+            logging.warning(f"Sheets request failed with {status}, retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def chunk_rows(rows, max_rows=MAX_ROWS_PER_CHUNK, max_bytes=MAX_BYTES_PER_CHUNK):
+    """Split rows into chunks bounded by row count and approximate JSON payload size"""
+    chunk, chunk_bytes = [], 0
+    for row in rows:
+        row_bytes = len(json.dumps(row, ensure_ascii=False, default=str).encode('utf-8'))
+        if chunk and (len(chunk) >= max_rows or chunk_bytes + row_bytes > max_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if chunk:
+        yield chunk
+
+
+class SheetsWriteQueue:
+    """Coalesces listings from several sources and writes them per sheet in one pass
+
+    Rows are deduplicated and appended by GoogleSheetsHandler.update_sheet, which
+    chunks, rate-limits and retries the actual API calls.
+    """
+
+    def __init__(self, handler, spreadsheet_id):
+        self.handler = handler
+        self.spreadsheet_id = spreadsheet_id
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, listings, sheet_name='Listings'):
+        """Queue listings for a sheet"""
+        with self.lock:
+            self.pending.setdefault(sheet_name, []).extend(listings)
+
+    def flush(self):
+        """Write all queued listings; listings for sheets that fail stay queued"""
+        with self.lock:
+            pending, self.pending = self.pending, OrderedDict()
+
+        written = 0
+        failed = OrderedDict()
+        for sheet_name, listings in pending.items():
+            try:
+                written += self.handler.update_sheet(self.spreadsheet_id, listings, sheet_name) or 0
+            except Exception as e:
+                logging.error(f"Error flushing {len(listings)} listings to {sheet_name}: {str(e)}")
+                failed[sheet_name] = listings
+
+        if failed:
+            with self.lock:
+                for sheet_name, listings in failed.items():
+                    self.pending.setdefault(sheet_name, [])[:0] = listings
+        return written
@@ -1,51 +1,122 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 import json
 import os
+import threading
 from datetime import datetime
 import pandas as pd
-from main import RealEstateOrchestrator
+from scrape_jobs import ScrapeJobStore, ScrapeWorkerPool, DuplicateJobError
+from event_bus import EventBus, EventRelay, format_sse
+from data_version import DataVersion
+import http_cache
+from http_cache import conditional
+from processors.listing_history import ListingHistory
+from processors.analytics_snapshot import AnalyticsSnapshotStore
 
 app = Flask(__name__)
+http_cache.init_app(app)
+
+RESULT_PREFIXES = {
+    'facebook': 'facebook_test_results_',
+    'yad2': 'yad2_test_results_'
+}
+
+class LatestDataCache:
+    """Parsed results files and their analytics, reloaded only when the files change
+
+    The cache key is the name, mtime and size of each source's latest results
+    file, so unrelated files written to the results directory do not force a
+    reload, and an unchanged request costs a directory listing and a few stat
+    calls instead of a JSON parse and DataFrame build.
+    """
+
+    def __init__(self, results_dir='.'):
+        self.results_dir = results_dir
+        self.key = None
+        self.data = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Return the cached data, reloading it if the results files changed"""
+        with self.lock:
+            if self.data is None or self.current_key() != self.key:
+                self.key, self.data = self.load()
+            return self.data
+
+    def current_key(self):
+        """(path, mtime, size) of each source's latest file; None if one vanished mid-check"""
+        try:
+            files = []
+            for source, path in self.latest_files().items():
+                if path:
+                    stat = os.stat(path)
+                    files.append((path, stat.st_mtime_ns, stat.st_size))
+                else:
+                    files.append((None, None, None))
+            return tuple(files)
+        except OSError:
+            return None
+
+    def latest_files(self):
+        """Newest results file per source (None if there is none)"""
+        names = os.listdir(self.results_dir)
+        latest = {}
+        for source, prefix in RESULT_PREFIXES.items():
+            matches = [f for f in names if f.startswith(prefix)]
+            latest[source] = os.path.join(self.results_dir, max(matches)) if matches else None
+        return latest
+
+    def load(self):
+        """Load the latest data from results files"""
+        data = {
+            'facebook': [],
+            'yad2': [],
+            'analytics': {}
+        }
+        key = None
+
+        try:
+            key = self.current_key()
+            if key is None:
+                raise OSError('results file removed while loading')
+            for source, (path, _, _) in zip(RESULT_PREFIXES, key):
+                if path:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data[source] = json.load(f)
+
+            # Calculate analytics
+            all_properties = data['facebook'] + data['yad2']
+            if all_properties:
+                df = pd.DataFrame(all_properties)
+                updated = max(mtime for path, mtime, _ in key if path) / 1e9
+                data['analytics'] = {
+                    'total_properties': len(all_properties),
+                    'avg_price': df['price'].mean() if 'price' in df else 'N/A',
+                    'avg_size': df['size'].mean() if 'size' in df else 'N/A',
+                    'locations': df['location'].value_counts().head(5).to_dict() if 'location' in df else {},
+                    'property_types': df['property_type'].value_counts().to_dict() if 'property_type' in df else {},
+                    'last_update': datetime.fromtimestamp(updated).strftime('%Y-%m-%d %H:%M:%S')
+                }
+        except Exception as e:
+            print(f"Error loading data: {str(e)}")
+            # Retry on the next request rather than caching a failed load
+            key = None
+
+        return key, data
+
+latest_data_cache = LatestDataCache()
+snapshots = AnalyticsSnapshotStore(os.path.join('data', 'analytics', 'snapshots'))
+scrape_jobs = ScrapeJobStore(os.path.join('data', 'scrape_jobs.db'))
+event_bus = EventBus()
+event_relay = EventRelay(scrape_jobs, event_bus)
+data_version = DataVersion(os.path.join('data', 'data_version.db'))
+
+def results_version():
+    """Version of everything /api/data returns: results files, snapshot and stored data"""
+    return (latest_data_cache.current_key(), snapshots.current_version(), data_version.get())
 
 def load_latest_data():
-    """Load the latest data from results files"""
-    data = {
-        'facebook': [],
-        'yad2': [],
-        'analytics': {}
-    }
-    
-    try:
-        # Get latest Facebook data
-        fb_files = [f for f in os.listdir() if f.startswith('facebook_test_results_')]
-        if fb_files:
-            latest_fb = max(fb_files)
-            with open(latest_fb, 'r', encoding='utf-8') as f:
-                data['facebook'] = json.load(f)
-
-        # Get latest Yad2 data
-        yad2_files = [f for f in os.listdir() if f.startswith('yad2_test_results_')]
-        if yad2_files:
-            latest_yad2 = max(yad2_files)
-            with open(latest_yad2, 'r', encoding='utf-8') as f:
-                data['yad2'] = json.load(f)
-
-        # Calculate analytics
-        all_properties = data['facebook'] + data['yad2']
-        if all_properties:
-            df = pd.DataFrame(all_properties)
-            data['analytics'] = {
-                'total_properties': len(all_properties),
-                'avg_price': df['price'].mean() if 'price' in df else 'N/A',
-                'avg_size': df['size'].mean() if 'size' in df else 'N/A',
-                'locations': df['location'].value_counts().head(5).to_dict() if 'location' in df else {},
-                'property_types': df['property_type'].value_counts().to_dict() if 'property_type' in df else {},
-                'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-    except Exception as e:
-        print(f"Error loading data: {str(e)}")
-    
-    return data
+    """Load the latest data from results files, cached until they change"""
+    return latest_data_cache.get()
 
 @app.route('/')
 def index():
@@ -53,20 +124,122 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/data')
+@conditional(results_version)
 def get_data():
-    """Get latest data"""
-    return jsonify(load_latest_data())
+    """Get latest data, with analytics from the pipeline's snapshot when there is one"""
+    data = load_latest_data()
+    snapshot = snapshots.load_latest()
+    if snapshot:
+        data = dict(data, analytics=snapshot)
+    return jsonify(data)
+
+@app.route('/api/statistics')
+@conditional(results_version)
+def get_statistics():
+    """Get dashboard statistics from the latest analytics snapshot"""
+    snapshot = snapshots.load_latest()
+    if snapshot:
+        return jsonify(snapshot)
+    
+    # No pipeline run has published a snapshot yet
+    analytics = load_latest_data()['analytics']
+    return jsonify({
+        'total_properties': analytics.get('total_properties', 0),
+        'new_today': 0,
+        'active_criteria': None,
+        'last_update': analytics.get('last_update'),
+        'version': 0
+    })
+
+@app.route('/api/price_drops')
+@conditional(data_version.get)
+def get_price_drops():
+    """Get listings whose price dropped recently"""
+    try:
+        history = ListingHistory(os.path.join('data', 'listing_history.db'))
+        drops = history.price_drops(
+            days_back=request.args.get('days', 30, type=int),
+            min_drop_pct=request.args.get('min_drop_pct', 0.0, type=float),
+            source=request.args.get('source')
+        )
+        return jsonify(drops)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
 
 @app.route('/api/run_scraper', methods=['POST'])
 def run_scraper():
-    """Run the scraper"""
+    """Queue a scrape job; the job workers run it in the background"""
     try:
-        source = request.json.get('source', 'all')
-        orchestrator = RealEstateOrchestrator()
-        orchestrator.run()
-        return jsonify({'status': 'success', 'message': 'Scraper started'})
+        source = (request.get_json(silent=True) or {}).get('source', 'all')
+        job = scrape_jobs.enqueue(source)
+        return jsonify({'status': 'queued', 'message': 'Scraper queued', 'job_id': job['id'], 'job': job}), 202
+    except DuplicateJobError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'job_id': e.job['id'], 'job': e.job}), 409
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/jobs')
+@conditional(scrape_jobs.last_event_id)
+def list_jobs():
+    """List recent scrape jobs, newest first"""
+    return jsonify(scrape_jobs.list_recent(request.args.get('limit', 20, type=int)))
+
+@app.route('/api/jobs/<job_id>')
+@conditional(scrape_jobs.last_event_id)
+def get_job(job_id):
+    """Get the status and progress of a scrape job"""
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one after its current stage"""
+    job = scrape_jobs.request_cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/stream')
+def stream_events():
+    """Stream scrape job progress and newly saved listings as server-sent events"""
+    event_relay.start()
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    
+    # Subscribe before replaying so nothing falls between the two
+    subscription = event_bus.subscribe()
+    
+    def generate():
+        seen = 0
+        try:
+            yield 'retry: 5000\n\n'
+            
+            # Replay what a reconnecting client missed
+            if last_id is not None:
+                for event in scrape_jobs.events_since(last_id):
+                    seen = event['id']
+                    yield format_sse(event)
+            
+            while True:
+                event = subscription.get(timeout=15)
+                if event is None:
+                    # Keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                elif event['id'] > seen:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Under gunicorn the jobs run in `python scrape_jobs.py`; the dev server runs them itself
+    ScrapeWorkerPool(scrape_jobs).start()
+    app.run(debug=True, port=5000, use_reloader=False, threaded=True)